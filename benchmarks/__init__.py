@@ -0,0 +1,12 @@
+"""
+benchmarks - Performance measurement scripts
+
+Each module of this package can be launched from the root of the 
+project, for example : python -m benchmarks.ref_points
+The scripts use SDL's dummy drivers so that no window is opened 
+and no sound is played.
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
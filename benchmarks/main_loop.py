@@ -0,0 +1,223 @@
+"""
+main_loop.py - Main loop benchmark
+
+Runs the stages of the main loop of turret.py (reference points,
+turret rotation, laser, detection, rain, debug mode...) headless
+and without frame rate limit for a given number of frames, with a
+scripted layout of mobs and one or more turrets. Reports the frames per second and the
+percentiles of the time spent in each stage, including the display
+update (full flip or dirty rectangles).
+
+The results can be saved in a JSON file and compared to a
+previous run to catch performance regressions :
+    python -m benchmarks.main_loop --output before.json
+    python -m benchmarks.main_loop --baseline before.json
+"""
+import argparse
+import json
+import math
+import sys
+import numpy as np
+from functions.display import pygame
+from functions.profiler import FrameTimer
+from functions.simulation import Simulation
+
+def mob_layout(count:int, width:int, height:int) -> list:
+    """Scripted layout : the mobs are evenly spread on a ring
+    around the turret, then on a larger one if needed
+
+    Args:
+        count: Number of mobs
+        width: Screen width
+        height: Screen height
+
+    Returns:
+        list: Coordinates of the mobs
+    """
+    center = np.array([width / 2, height / 2])
+    positions = []
+    radius = 220
+    while len(positions) < count:
+        # Number of mobs fitting on the ring with 80px between them
+        places = min(count - len(positions), int(2 * np.pi * radius / 80))
+        angles = np.linspace(0, 2 * np.pi, places, endpoint=False)
+        for angle in angles:
+            pos = center + radius * np.array([np.cos(angle), np.sin(angle)])
+            positions.append((int(pos[0]), int(pos[1])))
+        radius += 80
+    return positions
+
+class LayoutSpawner():
+    """Keeps the mobs of a scripted layout on the screen.
+
+    Each mob spawned from the layout is tracked with the index of
+    its position, the positions whose mob was removed go back to a
+    free list and only these ones are spawned again, so that a 
+    frame with a destroyed mob doesn't try the whole layout.
+    """
+    def __init__(self, simulation:Simulation, layout:list):
+        self.simulation = simulation
+        self.layout = layout
+        self.slots = {} # Mob id : index of its position
+        self.missing = list(range(len(layout))) # Free positions
+
+    def spawn(self) -> None:
+        """Spawns a mob on each free position of the layout"""
+        table = self.simulation.mobs.table
+        if len(table) < len(self.slots):
+            for mob_id in [mob_id for mob_id in self.slots 
+                           if mob_id not in table]:
+                self.missing.append(self.slots.pop(mob_id))
+        if not self.missing:
+            return
+
+        missing = []
+        for index in self.missing:
+            mob_id = self.simulation.spawn_mob(self.layout[index])
+            if mob_id is None:
+                # Another mob or a turret is still too close
+                missing.append(index)
+            else:
+                self.slots[mob_id] = index
+        self.missing = missing
+
+def turret_layout(count:int, width:int, height:int) -> list:
+    """Scripted layout of the turrets : a grid covering the 
+    screen, a single turret is at the center
+
+    Args:
+        count: Number of turrets
+        width: Screen width
+        height: Screen height
+
+    Returns:
+        list: Coordinates of the turrets
+    """
+    columns = math.ceil(math.sqrt(count * width / height))
+    rows = math.ceil(count / columns)
+    return [(int((i % columns + 0.5) * width / columns),
+             int((i // columns + 0.5) * height / rows))
+            for i in range(count)]
+
+def run(frames:int, mob_count:int, rain:bool = True, debug:bool = True,
+        respawn:bool = True, turret_count:int = 1,
+        dirty_rects:bool = False) -> tuple:
+    """Runs the benchmark
+
+    Args:
+        frames: Number of frames to run
+        mob_count: Number of mobs of the layout
+        rain: Rain animation
+        debug: Debug mode display
+        respawn: The destroyed mobs of the layout reappear
+        turret_count: Number of turrets
+        dirty_rects: Only the changed regions are sent to the display
+
+    Returns:
+        tuple: FrameTimer object and total duration in seconds
+    """
+    pygame.init()
+    screen = pygame.display.set_mode((1200, 800))
+    turrets = turret_layout(turret_count, screen.get_width(),
+                            screen.get_height())
+    simulation = Simulation(screen, rain=rain, debug=debug,
+                            turret_positions=turrets,
+                            dirty_rects=dirty_rects)
+    # The loading of the assets isn't part of the measures
+    simulation.prefetch()
+    simulation.mobs.max_living_mobs = max(simulation.mobs.max_living_mobs,
+                                          mob_count)
+
+    layout = mob_layout(mob_count, screen.get_width(), screen.get_height())
+    spawner = LayoutSpawner(simulation, layout)
+    spawner.spawn()
+
+    timer = FrameTimer()
+    simulation.timer = timer
+
+    for _ in range(frames):
+        # The respawn belongs to the script of the benchmark, not
+        # to the frame, it isn't part of the measures
+        if respawn:
+            spawner.spawn()
+
+        timer.begin_frame()
+        simulation.step()
+        simulation.render()
+        with simulation.stage("flip"):
+            simulation.present()
+        timer.end_frame()
+
+    total = sum(frame["frame"] for frame in timer.frames)
+    return timer, total
+
+def report(timer:FrameTimer, total:float) -> dict:
+    """Prints the results and returns them as a dict"""
+    frames = len(timer.frames)
+    fps = frames / total
+    summary = timer.summary()
+
+    print(f"{frames} frames in {total:.2f} s : {fps:.1f} fps")
+    print(f"{'stage':<12}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, stats in summary.items():
+        print(f"{name:<12}" + "".join(f"{stats[key]:9.3f}" for key in
+                                      ("mean", "p50", "p95", "p99", "max")))
+
+    return {"frames" : frames, "fps" : fps, "stages" : summary}
+
+def compare(results:dict, baseline:dict, max_regression:float) -> bool:
+    """Compares the results with a baseline, returns False if the
+    frame rate or the p95 of a stage got worse than max_regression
+    (ratio)"""
+    ok = True
+    if results["fps"] < baseline["fps"] * (1 - max_regression):
+        print(f"REGRESSION fps : {baseline['fps']:.1f} -> {results['fps']:.1f}")
+        ok = False
+
+    for name, stats in results["stages"].items():
+        if name not in baseline["stages"]:
+            continue
+        before = baseline["stages"][name]["p95"]
+        if before > 0 and stats["p95"] > before * (1 + max_regression):
+            print(f"REGRESSION {name} p95 : {before:.3f} -> {stats['p95']:.3f} ms")
+            ok = False
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--mobs", type=int, default=10,
+                        help="Number of mobs of the scripted layout")
+    parser.add_argument("--turrets", type=int, default=1,
+                        help="Number of turrets")
+    parser.add_argument("--rain", action=argparse.BooleanOptionalAction,
+                        default=True)
+    parser.add_argument("--debug", action=argparse.BooleanOptionalAction,
+                        default=True, help="Debug mode display")
+    parser.add_argument("--respawn", action=argparse.BooleanOptionalAction,
+                        default=True, help="Destroyed mobs reappear")
+    parser.add_argument("--dirty", action="store_true",
+                        help="Dirty rectangles display update")
+    parser.add_argument("--output", help="Saves the results in a JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="Tolerated slowdown ratio (default 0.10)")
+    args = parser.parse_args()
+
+    timer, total = run(args.frames, args.mobs, args.rain, args.debug,
+                       args.respawn, args.turrets, args.dirty)
+    results = report(timer, total)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if not compare(results, baseline, args.max_regression):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
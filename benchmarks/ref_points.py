@@ -0,0 +1,63 @@
+"""
+ref_points.py - Reference points benchmark
+
+Compares the time needed to get the reference points of the 
+turret with ref_points() and with a RefPointTable lookup, and 
+checks the maximal gap between both results.
+"""
+import argparse
+import timeit
+import numpy as np
+from functions.display import pygame, TurretSprites
+from functions.geometry import ref_points, RefPointTable
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--resolution", type=float, default=0.1,
+                        help="Angle resolution of the table in degrees")
+    parser.add_argument("--number", type=int, default=10000,
+                        help="Number of calls per measure")
+    args = parser.parse_args()
+    
+    pygame.init()
+    screen = pygame.display.set_mode((1200, 800))
+    turret_rect = TurretSprites().turret_sentinel.get_rect()
+    turret_rect.center = (600, 400)
+    
+    start = timeit.default_timer()
+    table = RefPointTable(screen, turret_rect, args.resolution)
+    build_time = timeit.default_timer() - start
+    
+    # Angles reached by the turret (multiples of the rotation steps)
+    angles = np.arange(args.number) * 0.6 % 360
+    
+    def run(function):
+        start = timeit.default_timer()
+        for angle in angles:
+            function(angle)
+        return (timeit.default_timer() - start) / args.number
+    
+    results = {
+        "ref_points" : run(lambda angle: ref_points(screen, turret_rect, angle)),
+        "table lookup" : run(table.lookup),
+        "table lookup (interpolated)" : run(lambda angle: table.lookup(angle, True))
+    }
+    
+    # Maximal gap between the table and ref_points()
+    max_gap = 0.0
+    for angle in np.random.default_rng(0).uniform(0, 360, 1000):
+        exact = ref_points(screen, turret_rect, angle)
+        approx = table.lookup(angle, interpolate=True)
+        for key in table.keys:
+            gap = np.hypot(*(np.array(exact[key]) - np.array(approx[key])))
+            max_gap = max(max_gap, gap)
+    
+    print(f"Table : {table.steps} angles, {table.table.nbytes / 1024:.0f} KiB, "
+          f"built in {build_time * 1000:.2f} ms")
+    reference = results["ref_points"]
+    for name, duration in results.items():
+        print(f"{name:<30}{duration * 1e6:8.2f} us/call  x{reference / duration:.1f}")
+    print(f"Max gap with interpolation : {max_gap:.4f} px")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+replay.py - Session replay benchmark
+
+Replays a session recorded by turret.py (record = "session.json")
+headless and without frame rate limit, checks that the scene ends
+in the recorded state and reports the frames per second and the
+percentiles of the time spent in each stage. Since the workload is
+the same from one build to another, the results can be compared
+as those of the main loop benchmark :
+    python -m benchmarks.replay session.json --output before.json
+    python -m benchmarks.replay session.json --baseline before.json
+"""
+import argparse
+import json
+import sys
+from functions.display import pygame
+from functions.profiler import FrameTimer
+from functions.replay import load_session, replay_session
+from benchmarks.main_loop import report, compare
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("session", help="Session recorded by turret.py")
+    parser.add_argument("--render", action=argparse.BooleanOptionalAction,
+                        default=True, help="Draws the scene at each step")
+    parser.add_argument("--output", help="Saves the results in a JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="Tolerated slowdown ratio (default 0.10)")
+    args = parser.parse_args()
+
+    session = load_session(args.session)
+
+    pygame.init()
+    screen = pygame.display.set_mode(session["render_size"])
+
+    timer = FrameTimer()
+    simulation = replay_session(screen, session, args.render, timer)
+
+    # The replay must end in the recorded state, otherwise the
+    # workload differs and the timings can't be compared
+    identical = simulation.state_digest() == session["digest"]
+    print(f"{session['steps']} steps, {len(session['clicks'])} clicks, "
+          f"outcome {'identical' if identical else 'DIFFERENT'}")
+
+    total = sum(frame["frame"] for frame in timer.frames)
+    results = report(timer, total)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if not identical:
+        sys.exit(2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if not compare(results, baseline, args.max_regression):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+startup.py - Startup benchmark
+
+Measures the time needed to load the sprites resized at startup 
+(mobs, turret, turret base, blast and steam frames, lightning) 
+and to decode the sounds without the asset cache, with an empty 
+cache (cold start, the cache is filled) and with a filled cache 
+(warm start). Then reports the memory used by the samples of each 
+sound, fully resident or streamed.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+import numpy as np
+from functions.display import pygame, Mobs, TurretSprites, turret_base_sprite
+from functions.animation import ExplosionPool, SteamAnimation, Thunder
+from functions.assets import get_asset_cache, get_assets
+from functions.sound import SoundManager
+
+loaders = {
+    "mob sprites" : lambda: Mobs().loading_sprites(),
+    "turret sprites" : TurretSprites,
+    "turret base" : turret_base_sprite,
+    "blast frames" : lambda: ExplosionPool().load(),
+    "steam frames" : lambda: SteamAnimation().load(),
+    "lightning" : lambda: Thunder().load(),
+    "sounds" : lambda: SoundManager().prefetch()
+}
+
+def load_all(asset_cache, enabled:bool, clear:bool) -> dict:
+    """Loads all the sprites and returns the duration of each group
+
+    Args:
+        asset_cache: AssetCache object
+        enabled: Use of the cache
+        clear: Empties the cache folder first (cold start)
+    """
+    asset_cache.enabled = enabled
+    if clear:
+        asset_cache.clear()
+    # As in a new process, neither the images nor the hashes of 
+    # the files are in memory yet
+    get_assets().forget()
+    asset_cache.hashes = {}
+
+    durations = {}
+    for name, loader in loaders.items():
+        start = time.perf_counter()
+        loader()
+        durations[name] = time.perf_counter() - start
+    durations["total"] = sum(durations.values())
+    return durations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of measures, the median is kept")
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((1200, 800))
+
+    # The measures use a temporary cache folder
+    asset_cache = get_asset_cache()
+    folder = tempfile.mkdtemp(prefix="turret_assets_")
+    asset_cache.folder = folder
+
+    modes = {"no cache" : (False, False),
+             "cold" : (True, True),
+             "warm" : (True, False)}
+    results = {mode : [] for mode in modes}
+    try:
+        for _ in range(args.repeat):
+            for mode, (enabled, clear) in modes.items():
+                results[mode].append(load_all(asset_cache, enabled, clear))
+
+        # Memory of the samples, the streamed sounds only keep 
+        # their ring of chunks, counted full as during the playback
+        reports = {}
+        for streaming in (False, True):
+            get_assets().forget()
+            sound_manager = SoundManager()
+            sound_manager.streaming = streaming
+            sound_manager.prefetch()
+            reports[streaming] = sound_manager.memory_report()
+    finally:
+        shutil.rmtree(folder)
+
+    names = list(loaders) + ["total"]
+    print(f"{'':<16}" + "".join(f"{mode:>12}" for mode in modes) + "   (ms, median)")
+    for name in names:
+        medians = [np.median([run[name] for run in results[mode]]) * 1000
+                   for mode in modes]
+        print(f"{name:<16}" + "".join(f"{value:12.2f}" for value in medians))
+
+    print()
+    print(f"{'sound':<16}{'resident':>12}{'streaming':>12}   (KiB in memory)")
+    for name, (_, resident, _) in reports[False].items():
+        mode, streamed, _ = reports[True][name]
+        note = "  streamed" if mode == "streamed" else ""
+        print(f"{name:<16}{resident / 1024:12.0f}{streamed / 1024:12.0f}{note}")
+    totals = [sum(entry[1] for entry in reports[mode].values()) / 1024
+              for mode in (False, True)]
+    print(f"{'total':<16}{totals[0]:12.0f}{totals[1]:12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+sweep.py - Parameter sweep benchmark
+
+Runs one headless simulation per combination of a grid of tuning
+parameters (rotation speeds of the turret, detection radius of the
+mobs, projectile speed, maximum number of mobs) on a pool of
+processes, one per core by default, and gathers the metrics of all
+the runs in a single table :
+    python -m benchmarks.sweep --sentinel-speed 36 72 --alert-speed 6 12
+    python -m benchmarks.sweep --projectile-speed 180 360 --output sweep.json
+
+Every run plays the same scripted layout of mobs and turrets with
+the same seeds for the same simulated duration, without window nor
+sound output, so that only the parameters differ. The metrics are :
+    first_kill  Simulated seconds before the first destroyed mob
+    kills_min   Destroyed mobs per simulated minute
+    lost        Mobs detected by the laser and lost before the
+                cannon reached them (alert mode back to sentinel).
+                It only stands in for the missed detections: the
+                detection tests the whole sector swept by the laser,
+                so a mob can't cross it without being detected
+    step_ms     Mean and p95 real time of a step and its render
+"""
+import os
+
+# The workers open the display and the mixer without any output,
+# and leave SIGINT and SIGTERM to Python so that the pool can stop 
+# them
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
+
+import argparse
+import itertools
+import json
+import multiprocessing
+from functions.display import pygame
+from functions.geometry import np
+from functions.profiler import FrameTimer
+from functions.simulation import Simulation, SEED_NAMES
+from functions.turrets import SENTINEL, ALERT
+from benchmarks.main_loop import LayoutSpawner, mob_layout, turret_layout
+
+# Parameters of the grid and their current values. The speeds are
+# in degrees per second, the distances in pixels at the reference
+# resolution
+PARAMETERS = {
+    "sentinel_speed" : 36.0,
+    "alert_speed" : 6.0,
+    "hit_radius" : 4.0,
+    "projectile_speed" : 180.0,
+    "max_mobs" : 10
+}
+
+def apply(simulation:Simulation, params:dict) -> None:
+    """Sets the parameters of a run on a simulation
+
+    Args:
+        simulation: The simulation, before its first step
+        params: Value of each name of PARAMETERS
+    """
+    bank = simulation.turret_bank
+    resolution = simulation.resolution
+    bank.speeds[SENTINEL] = params["sentinel_speed"]
+    bank.speeds[ALERT] = params["alert_speed"]
+    bank.hit_radius = resolution.length(params["hit_radius"])
+    bank.projectiles.speed = resolution.length(params["projectile_speed"])
+    simulation.mobs.max_living_mobs = int(params["max_mobs"])
+
+def init_worker(size:tuple) -> None:
+    """Opens the headless display of a worker process, shared by
+    all its runs"""
+    pygame.init()
+    pygame.display.set_mode(size)
+
+def run(task:tuple) -> dict:
+    """Runs one combination of the grid in a worker process
+
+    Args:
+        task: Index of the combination, parameters and settings
+        of the sweep (seconds, mobs, turrets, rain, render, seeds)
+
+    Returns:
+        dict: The parameters and the metrics of the run
+    """
+    index, params, settings = task
+    screen = pygame.display.get_surface()
+    width, height = screen.get_size()
+
+    simulation = Simulation(screen, rain=settings["rain"], debug=False,
+                            turret_positions=turret_layout(settings["turrets"], width, height),
+                            seeds=settings["seeds"])
+    # The mobs and the thunder are shared with the previous runs
+    # of the worker
+    simulation.mobs.clear()
+    simulation.thunder.reset()
+    simulation.prefetch()
+    apply(simulation, params)
+
+    mobs = simulation.mobs
+    bank = simulation.turret_bank
+    spawner = LayoutSpawner(simulation, mob_layout(settings["mobs"], width, height))
+    step = simulation.timestep.step
+    steps = int(round(settings["seconds"] / step))
+
+    timer = FrameTimer()
+    first_kill = None
+    lost = 0
+    for number in range(steps):
+        # The destroyed mobs of the layout reappear, outside of the
+        # measured step
+        spawner.spawn()
+
+        timer.begin_frame()
+        modes = bank.modes.copy()
+        simulation.step()
+        if settings["render"]:
+            simulation.render()
+        timer.end_frame()
+
+        lost += int(np.count_nonzero((modes == ALERT) & (bank.modes == SENTINEL)))
+        if first_kill is None and mobs.destroyed_count:
+            first_kill = (number + 1) * step
+
+    frame = timer.summary()["frame"]
+    return {"index" : index, **params,
+            "first_kill" : first_kill,
+            "kills_min" : mobs.destroyed_count * 60 / settings["seconds"],
+            "lost" : lost,
+            "step_ms" : frame["mean"],
+            "step_p95" : frame["p95"]}
+
+def report(results:list) -> None:
+    """Prints the results of the sweep as a table"""
+    columns = list(PARAMETERS) + ["first_kill", "kills_min", "lost",
+                                  "step_ms", "step_p95"]
+    widths = [max(len(name), 9) + 2 for name in columns]
+    print("".join(f"{name:>{width}}" for name, width in zip(columns, widths)))
+    for result in results:
+        cells = []
+        for name, width in zip(columns, widths):
+            value = result[name]
+            if value is None:
+                cells.append(f"{'-':>{width}}")
+            elif isinstance(value, float):
+                cells.append(f"{value:>{width}.3f}")
+            else:
+                cells.append(f"{value:>{width}}")
+        print("".join(cells))
+    print("lost : alerts dropped before the shot, stand-in for the "
+          "missed detections")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, default in PARAMETERS.items():
+        parser.add_argument("--" + name.replace("_", "-"), nargs="+",
+                            type=type(default), default=[default],
+                            help=f"Values to sweep (default {default})")
+    parser.add_argument("--seconds", type=float, default=60,
+                        help="Simulated duration of each run")
+    parser.add_argument("--mobs", type=int, default=20,
+                        help="Number of mobs of the scripted layout")
+    parser.add_argument("--turrets", type=int, default=1,
+                        help="Number of turrets")
+    parser.add_argument("--rain", action=argparse.BooleanOptionalAction,
+                        default=False)
+    parser.add_argument("--render", action=argparse.BooleanOptionalAction,
+                        default=True, help="Draws the scene at each step")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the random generators of every run")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of processes (default one per core)")
+    parser.add_argument("--output", help="Saves the results in a JSON file")
+    args = parser.parse_args()
+
+    # One task per combination of the grid, all with the same
+    # layout and seeds
+    settings = {"seconds" : args.seconds, "mobs" : args.mobs,
+                "turrets" : args.turrets, "rain" : args.rain,
+                "render" : args.render,
+                "seeds" : {name: args.seed + i for i, name in enumerate(SEED_NAMES)}}
+    values = [getattr(args, name) for name in PARAMETERS]
+    tasks = [(index, dict(zip(PARAMETERS, combination)), settings)
+             for index, combination in enumerate(itertools.product(*values))]
+
+    workers = max(1, min(args.workers, len(tasks)))
+    print(f"{len(tasks)} runs of {args.seconds:g} s on {workers} processes")
+
+    results = []
+    with multiprocessing.Pool(workers, initializer=init_worker,
+                              initargs=((1200, 800),)) as pool:
+        for result in pool.imap_unordered(run, tasks):
+            results.append(result)
+            print(f"  {len(results)}/{len(tasks)}", end="\r", flush=True)
+        pool.close()
+        pool.join()
+    print()
+    results.sort(key=lambda result: result["index"])
+
+    report(results)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -2,65 +2,22 @@
 animation.py - Animation module
 
 Module containing the classes and functions responsible for 
-different animations, such as turret rotation, rain or projectiles
+different animations, such as projectiles, explosions or rain
 """
 import os
 import time
 from functions.geometry import np, get_distance, midpoint
 from functions.display import pygame, random, get_mobs
 from functions.sound import get_sounds
+from functions.assets import get_assets
+from functions.resolution import get_resolution
+from functions.weather import WeatherScheduler, event_rate
 
 sounds = get_sounds()
 mobs = get_mobs()
+assets = get_assets()
+resolution = get_resolution()
 
-class Rotation():
-  """ The positions and angular velocities of the turret are crucial 
-  values in the program and must be able to be consulted and modified 
-  by most functions. For this we create a Rotation class whose 
-  instantiated object can be distributed to the functions concerned 
-  and manipulated by them so that all parties are aware of the 
-  states of the turret.
-  The object has 3 rotation modes: 'sentinel', 'alert' and 'fire' 
-  with different rotation speeds for each of them
-  """  
-  def __init__(self):
-    self.angle = 0
-    self.current_speed = 0
-    self.rotation_speed_sentinel = 0.6
-    self.rotation_speed_alert = 0.1
-    self.rotation_speed_fire = 0.0 # No rotation
-    self.mode = "sentinel" # "alert", "fire"
-    
-  def rotate(self):
-    """Increases the angle value depending on the rotation mode"""
-    if self.mode == "sentinel": # Search for targets
-      self.angle += self.rotation_speed_sentinel
-      self.current_speed = self.rotation_speed_sentinel
-      
-    if self.mode == "alert": # Target found
-      self.angle += self.rotation_speed_alert
-      self.current_speed = self.rotation_speed_alert
-      
-    if self.mode == "fire": # Ready to fire
-      self.angle += self.rotation_speed_fire
-      self.current_speed = self.rotation_speed_fire
-    
-    # WORK IN PROGRESS
-    if self.mode == "retract": # Ready to retract
-        self.angle += self.rotation_speed_fire
-        self.current_speed = self.rotation_speed_fire
-    
-  def get_angle(self) -> int:
-    """ Get current turret angle """
-    return int(self.angle%360)
-
-rotation = Rotation()
-
-def get_rotation():
-    """ Allows other modules to retrieve the rotation object """
-    return rotation
-
-# ---------- <WORK IN PROGRESS> ----------
 class SteamAnimation(pygame.sprite.Sprite):
     """ WORK IN PROGRESS - NOT YET USED
     TODO : Correctly position the sprites according to the rotations
@@ -73,22 +30,26 @@ class SteamAnimation(pygame.sprite.Sprite):
         
         self.in_animation = False
         self.steam_played = 0
-        self.sprites = []
+        self.sprites = [] # Loaded on first use
         
         self.debug_print = 0
         
+        self.current_sprite = 0
+        self.image = None
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        #self.rect.bottomleft = pygame.math.Vector2(100,100)
+    
+    def load(self) -> None:
+        """Loads the sprites of the animation"""
+        self.sprites = []
         for i in range(0,self.number_of_sprites):
             path = self.folder + f"/steam_{i}.png"
-            img = pygame.image.load(path)
-            img = pygame.transform.smoothscale_by(img, 0.5)
+            img = assets.image(path, resolution.scale(0.5))
             #img = pygame.transform.rotate(img, 90)
             self.sprites.append(img)
         
-        self.current_sprite = 0
         self.image = self.sprites[self.current_sprite]
-        
         self.rect = self.image.get_rect()
-        #self.rect.bottomleft = pygame.math.Vector2(100,100)
     
     def how_many_sprites(self, folder:str) -> int:
         """Determines how many .png files are in the folder
@@ -112,6 +73,8 @@ class SteamAnimation(pygame.sprite.Sprite):
     def arrange(self, refs:dict, rotationObject):
         """ Adapts the size and rotation of sprites based 
         on reference points"""
+        if not self.sprites:
+            self.load()
         sprite_rect = self.sprites[1].get_rect()
         self.sprites = []
         origin = refs["steam_origin"]
@@ -127,8 +90,7 @@ class SteamAnimation(pygame.sprite.Sprite):
         
         for i in range(0,self.number_of_sprites):
             path = self.folder + f"/steam_{i}.png"
-            img = pygame.image.load(path)
-            img = pygame.transform.smoothscale_by(img, 0.5)
+            img = assets.image(path, resolution.scale(0.5))
             img = pygame.transform.rotate(img, -angle_rad)
             rotated_rect = img.get_rect(center=rect.center)
             self.sprites.append(img)
@@ -176,55 +138,131 @@ def steam_jet(screen:pygame.surface.Surface, refs:dict,
         steam_anim.animate(anim_bool=True)
 # ---------- </WORK IN PROGRESS> ----------
 
-class Blast(pygame.sprite.Sprite):
-    """ Blast animation """
+class ExplosionPool():
+    """ Blast animations, each image is displayed for 
+    self.frame_duration seconds.
     
-    def __init__(self):
-        pygame.sprite.Sprite.__init__(self)
-        
+    All the explosions share the same list of images, loaded at 
+    the first explosion. An explosion is only a record in NumPy 
+    arrays (position, start tick, id of the destroyed mob), the 
+    image to display is deduced from the time elapsed since its 
+    start, so any number of explosions can run at once. At the 
+    end of its animation, the mob of the explosion is deleted.
+    """
+    
+    def __init__(self, capacity:int = 16):
         self.folder = "assets/images/sprites/anim/blast"
         self.nb_of_sprites = self.how_many_sprites(self.folder)
         
-        self.images = []
+        self.images = None # Loaded on first use
+        self.offsets = None # Center to top left corner of each image
+        self.frame_duration = 5/60 # Seconds
+        
+        self.tick = 0 # Number of simulation steps
+        self.step = 1/60 # Duration of the last step
         self.blast_played = 0 # Animation counter
-        self.blast_sound_played = 0 # Sound counter
-        self.target_hit = False
         
+        self.capacity = capacity
+        self.active = np.zeros(capacity, dtype=bool)
+        self.pos = np.zeros((capacity, 2))
+        self.start_tick = np.zeros(capacity, dtype=np.int64)
+        self.target_id = np.zeros(capacity, dtype=np.int64)
+    
+    def __len__(self) -> int:
+        """Number of explosions in progress"""
+        return int(np.count_nonzero(self.active))
+    
+    def load(self) -> None:
+        """Loads the images of the animation if they aren't already"""
+        if self.images is not None:
+            return
+        
+        self.images = []
         for num in range(1, self.nb_of_sprites+1):
-            img = pygame.image.load(f"assets/images/sprites/anim/blast/blast_{num}.png")
-            img = pygame.transform.smoothscale_by(img, 0.2)
+            img = assets.image(f"{self.folder}/blast_{num}.png", 
+                               resolution.scale(0.2))
             self.images.append(img)
         
-        self.index = 0
-        self.image = self.images[self.index]
-        self.rect = self.image.get_rect()
-        self.counter = 0
+        self.offsets = np.array([(img.get_width() / 2, img.get_height() / 2) 
+                                 for img in self.images])
     
-    def positioning(self, pos:tuple):
-        """Place the center of the explosion at the coordinates 
-        of the currently targeted mob
+    def grow(self) -> None:
+        """Doubles the number of records, only when all of them 
+        are in use"""
+        for name in ("active", "pos", "start_tick", "target_id"):
+            column = getattr(self, name)
+            grown = np.zeros((self.capacity * 2,) + column.shape[1:], 
+                             dtype=column.dtype)
+            grown[:self.capacity] = column
+            setattr(self, name, grown)
+        self.capacity *= 2
+    
+    def spawn(self, positions:np.ndarray, target_ids:np.ndarray) -> None:
+        """Starts explosions, several at once if needed
 
         Args:
-            pos: Coordinates of the center of the explosion
-            (tuple or Vector2)
-        """        
-        self.rect.center = pos
+            positions: Array of shape (n, 2) of the centers of the 
+            explosions
+            target_ids: Ids of the mobs destroyed by the explosions
+        """
+        self.load()
+        
+        # Free records, in order
+        free = np.flatnonzero(~self.active)
+        while free.size < len(target_ids):
+            self.grow()
+            free = np.flatnonzero(~self.active)
+        slots = free[:len(target_ids)]
+        
+        self.pos[slots] = positions
+        self.start_tick[slots] = self.tick
+        self.target_id[slots] = target_ids
+        self.active[slots] = True
     
-    def update(self):
-        explosion_speed = 5
-        self.counter += 1
+    def frames(self, live:np.ndarray) -> np.ndarray:
+        """Index of the image of the given explosions, according 
+        to the time elapsed since their start"""
+        elapsed = (self.tick - self.start_tick[live]) * self.step
+        return (elapsed / self.frame_duration + 1e-9).astype(int)
+    
+    def update(self, dt:float = 1/60) -> None:
+        """Moves all the explosions forward by one simulation 
+        step, the finished ones delete their mob
 
-        if self.counter >= explosion_speed and self.index < len(self.images) - 1:
-            self.counter = 0
-            self.index += 1
-            self.image = self.images[self.index]
+        Args:
+            dt: Duration of the simulation step in seconds
+        """
+        self.tick += 1
+        self.step = dt
+        
+        live = np.flatnonzero(self.active)
+        if live.size == 0:
+            return
         
-        if self.index >= len(self.images) - 1 and self.counter >= explosion_speed:
-            self.kill()
-            mobs.kill_mob()
-            self.index = 0
-            self.counter = 0
-            self.blast_played += 1
+        finished = live[self.frames(live) >= self.nb_of_sprites]
+        for slot in finished.tolist():
+            mobs.kill_mob(int(self.target_id[slot]))
+        
+        self.active[finished] = False
+        self.blast_played += finished.size
+    
+    def draw(self, screen:pygame.surface.Surface) -> list:
+        """Displays all the explosions in progress
+
+        Args:
+            screen: Main Pygame surface
+
+        Returns:
+            list: Rects of the drawn frames
+        """
+        live = np.flatnonzero(self.active)
+        if live.size == 0:
+            return []
+        
+        frames = np.minimum(self.frames(live), self.nb_of_sprites - 1)
+        topleft = self.pos[live] - self.offsets[frames]
+        return screen.blits([(self.images[frame], pos) for frame, pos in 
+                             zip(frames.tolist(), topleft.tolist())])
     
     def how_many_sprites(self, folder:str) -> int:
         """Determines how many .png files are in the folder
@@ -245,364 +283,274 @@ class Blast(pygame.sprite.Sprite):
         
         return number_of_files
 
-blast_group = pygame.sprite.Group()        
-blast_anim = Blast()
-
-def blast_launcher(screen:pygame.surface.Surface):
-    """Launching the blast animation.
+class ProjectilePool():
+    """Projectiles animation, each projectile moves at self.speed 
+    pixels per second towards the point where its target was.
     
-    The animation is only launched at the precise moment when 
-    the projectile comes into contact with the targeted mob. 
-    The function is called in the fire_mode() function of 
-    the RotateTurret class.
-
-    Args:
-        screen: Main Pygame surface
-    """    
-    blast_anim.positioning(mobs.in_target)
-    blast_group.draw(screen)
-    blast_group.update()
-    blast_group.add(blast_anim)
-
-class Projectile():
-    """Projectile animation"""
+    Any number of projectiles can be in flight. They are stored 
+    in preallocated NumPy arrays (positions, velocities, colors, 
+    targets...) in which each projectile occupies a slot, freed 
+    on arrival and reused by the next shots. All the projectiles 
+    in flight are moved in one step and their arrivals are 
+    returned together.
+    """
     
-    def __init__(self):
-        self.start_point = None
-        self.target_point = None
-        self.current_pos = None
-        self.move_vector = None
-        self.speed = 3
-        self.bang_played = 0 # Animation counter
-        self.bang_sound_played = 0 # Sound counter
-        self.vals_initialized = 0 # Process counter
-        self.retract_sound_palayed = 0 # WORK IN PROGRESS 
-    
-    def init_vals(self, start:pygame.math.Vector2, 
-             target:pygame.math.Vector2):
-        """Sets constructor attribute values, like the starting 
-        and ending point of the projectile as well as calculating 
-        the direction vector
-
-        Args:
-            start: Projectile starting point coordinates
-            target: Projectile target point coordinates
-        """
-        # Since this function will be called in a local loop of 
-        # the program (the fire_mode function of the RotateTurret 
-        # class), we ensure that the values are only initialized 
-        # once
-        if self.vals_initialized < 1:
-            self.start_point = start
-            self.target_point = target
-            self.current_pos = self.start_point
-            self.move_vector = self.target_point - self.start_point
-            
-            # The magnitude of the vector is normalized to 1 
-            # because we are only interested in the direction.
-            self.move_vector.normalize_ip()
-            
-            self.vals_initialized = 1
-            
-            # The green value of the projectile's RGB varies in 
-            # color_jump steps during the animation
-            self.green_val = 200
-            self.color_jump = 20
+    def __init__(self, capacity:int = 32):
+        self.capacity = capacity
+        self.speed = resolution.length(180) # Pixels per second
+        self.rng = random.Random() # Flame effect
+        
+        # The green value of the projectile's RGB varies in 
+        # color_jump steps during the animation
+        self.green_start = 200
+        self.color_jump = 20
+        
+        self.active = np.zeros(capacity, dtype=bool)
+        self.pos = np.zeros((capacity, 2))
+        self.previous_pos = np.zeros((capacity, 2)) # Before the last step
+        self.velocity = np.zeros((capacity, 2))
+        self.target_point = np.zeros((capacity, 2))
+        self.green = np.zeros(capacity, dtype=np.int32)
+        self.target_id = np.zeros(capacity, dtype=np.int64)
+        self.owner = np.zeros(capacity, dtype=np.int64) # Turret index
+    
+    def __len__(self) -> int:
+        """Number of projectiles in flight"""
+        return int(np.count_nonzero(self.active))
     
-    def animate(self, screen:pygame.surface.Surface, start:pygame.math.Vector2, 
-             target:pygame.math.Vector2, mobsObject):
-        """Start of projectile animation
+    def grow(self) -> None:
+        """Doubles the number of slots, only when all of them 
+        are in flight"""
+        for name in ("active", "pos", "previous_pos", "velocity",
+                     "target_point", "green", "target_id", "owner"):
+            column = getattr(self, name)
+            grown = np.zeros((self.capacity * 2,) + column.shape[1:], 
+                             dtype=column.dtype)
+            grown[:self.capacity] = column
+            setattr(self, name, grown)
+        self.capacity *= 2
+    
+    def fire(self, start:tuple, target:tuple, target_id:int, 
+             owner:int) -> int:
+        """Launches a projectile in a free slot
 
         Args:
-            screen: Main Pygame surface
             start: Projectile starting point coordinates
             target: Projectile target point coordinates
-            mobsObject: Mobs object
-        """
+            target_id: Id of the targeted mob
+            owner: Index of the turret firing
 
-        # Initialization of the values necessary for establishing 
-        # the trajectory
-        self.init_vals(start, target)
-        
-        if self.bang_played < 1:
-            # Play sound
-            if projectile.bang_sound_played < 1:
-                sounds.play_sound("fire")
-                projectile.bang_sound_played += 1
-                
-            # We vary the green value and set random values to 
-            # the projectile radius to add a flame effect
-            self.green_val = (self.green_val + self.color_jump) % 255
-            radius = random.randint(2,9)
-            
-            # Movement of the projectile according to the defined 
-            # vector and speed
-            self.current_pos += self.move_vector * self.speed
-            
-            # Projectile display
-            pygame.draw.circle(screen, (255,self.green_val,0), (int(self.current_pos.x), 
-                int(self.current_pos.y)), radius)
-
-            # The projectile has reached its destination, we add a 
-            # proximity margin to ensure that the point will not 
-            # be skipped
-            if self.current_pos.distance_to(self.target_point) < 5:
-                self.bang_played = 1 # Animation counter
-                
-                # The targeted projectile is transformed into 
-                # debris so that the turret remains aligned until 
-                # the explosion animation ends
-                mobsObject.destroyed_mob()
-                
-                # Signal sent to the Blast class object to let it 
-                # know that the explosion can take place. The 
-                # fire_mode() function of the Rotate Turret class 
-                # will be responsible for launching it
-                blast_anim.target_hit = True
-                
-                # Play blast sound
-                if not sounds.in_playing("blast"):
-                    sounds.play_sound("blast")
-                    blast_anim.blast_sound_played+=1
-
-projectile = Projectile()
-
-class RotateTurret:
-    """Turns the turret according to the different rotation modes 
-    (sentinel, alert, fire). These modes are defined by the 
-    Rotation class"""
-    
-    def __init__(self):
-        self.turret_mode = None
-        self.turret_image = None
-        self.deploy_sound_played = 0
+        Returns:
+            int: Slot of the projectile
+        """
+        # First free slot
+        slot = int(np.argmin(self.active))
+        if self.active[slot]:
+            slot = self.capacity
+            self.grow()
+        
+        self.pos[slot] = start
+        self.previous_pos[slot] = start
+        self.target_point[slot] = target
+        
+        # The direction vector is normalized to 1 then multiplied 
+        # by the speed
+        direction = self.target_point[slot] - self.pos[slot]
+        length = np.hypot(direction[0], direction[1])
+        if length > 0:
+            direction /= length
+        self.velocity[slot] = direction * self.speed
+        
+        self.green[slot] = self.green_start
+        self.target_id[slot] = target_id
+        self.owner[slot] = owner
+        self.active[slot] = True
+        
+        sounds.play_sound("fire")
+        return slot
     
-    def reset_states(self):
-        """Reset all state variables when resuming sentinel mode"""
-        
-        # Blast class
-        blast_anim.target_hit = False
-        blast_anim.blast_played = 0
-        blast_anim.blast_sound_played = 0
-        
-        # Projectile class
-        projectile.bang_sound_played = 0
-        projectile.vals_initialized = 0
-        projectile.bang_played = 0
-        
-        self.deploy_sound_played = 0
-        steam_anim.steam_played = 0 # WORK IN PROGRESS
-        
-    def sentinel_mode(self, turretObject, mobsObject):
-        """The turret is searching for a target
+    def cancel(self, owners:np.ndarray) -> None:
+        """Removes the projectiles fired by the given turrets
 
         Args:
-            turretObject: TurretSprites object (from display module)
-            mobsObject: Mobs object (from display module)
+            owners: Indices of the turrets
         """
-        self.reset_states() # Resetting all state variables
-        mobsObject.in_target = None # No target 
-        
-        # Play sentinel sound
-        if not sounds.in_playing("sentinel"):
-            sounds.play_sound("sentinel")
-        
-        # Set turret sprite
-        self.turret_image = turretObject.turret_sentinel
+        self.active &= ~np.isin(self.owner, owners)
     
-    def alert_mode(self, turretObject) -> None:
-        """The turret laser has detected a mob
+    def update(self, dt:float) -> np.ndarray:
+        """Moves all the projectiles in flight by one simulation step
 
         Args:
-            turretObject: TurretSprites object (from display module)
-        """        
-        sounds.stop_sound("sentinel") # Stop sentinel sound
-        
-        # Play alert sound
-        if not sounds.in_playing("alert"):
-            sounds.play_sound("alert")
-        
-        # Set turret sprite
-        self.turret_image = turretObject.turret_alert
-    
-    def fire_mode(self, screen:pygame.surface.Surface, 
-                  turretObject, mobsObject, refs:dict) -> None:
-        """The turret cannon is aligned with the mob.
-        
-        The Rotation class sets the fire mode rotation speed 
-        to 0.0, i.e. the turret is stationary. This mode launches 
-        the projectile animation as well as the blast animation
+            dt: Duration of the simulation step in seconds
 
-        Args:
-            screen: Main Pygame surface
-            turretObject: TurretSprites object (from display module)
-            mobsObject : Mobs object (from display module) 
-            refs (dict): All referential points
+        Returns:
+            np.ndarray: Slots of the projectiles which reached 
+            their destination during this step. They are freed, 
+            their target_id, owner and target_point stay readable 
+            until the next shot
         """
-        # Sounds to stop
-        sounds.stop_sound("alert")
-        sounds.stop_sound("sentinel")
-        
-        # Set turret sprite
-        self.turret_image = turretObject.turret_fire
-        
-        # Play deploy sound
-        if self.deploy_sound_played < 1:
-            sounds.play_sound("deploy")
-            self.deploy_sound_played+=1
-        
-        # When the sound deploy is finished, the projectile 
-        # animation is started
-        if not sounds.in_playing("deploy"):
-            #steam_jet(screen, refs, rotationObject) # WIP
-            projectile.animate(screen, refs["cannon"], mobsObject.in_target, mobsObject)
-
-        # The projectile has reached the coordinates of the mob, 
-        # the blast animation can be started
-        if blast_anim.target_hit and blast_anim.blast_played < 1:
-            blast_launcher(screen)
-        
-    def rotate(self, screen:pygame.surface.Surface, 
-               turretObject,rotationObject:Rotation, 
-               mobsObject, refs:dict) -> None:
-        """Rotates the turret according to the angle and speed 
-        determined by the Rotation class
+        live = np.flatnonzero(self.active)
+        if live.size == 0:
+            return live
+        
+        # We vary the green value to add a flame effect
+        self.green[live] = (self.green[live] + self.color_jump) % 255
+        
+        # Movement of the projectiles according to their velocity
+        self.previous_pos[live] = self.pos[live]
+        self.pos[live] += self.velocity[live] * dt
+        
+        # A projectile has reached its destination, we add a 
+        # proximity margin to ensure that the point will not 
+        # be skipped, a long step may also have passed it
+        remaining = self.target_point[live] - self.pos[live]
+        distance = np.hypot(remaining[:, 0], remaining[:, 1])
+        passed = np.einsum("ij,ij->i", remaining, self.velocity[live]) < 0
+        arrived = live[(distance < 5) | passed]
+        
+        self.active[arrived] = False
+        return arrived
+    
+    def draw(self, screen:pygame.surface.Surface, alpha:float = 1.0) -> list:
+        """Projectiles display, between their two last positions
 
         Args:
             screen: Main Pygame surface
-            turretObject: TurretSprites object (from display module)
-            rotationObject: Rotation object
-            mobsObject: Mobs object (from display module)
-            refs: All referential points
-        """        
-        
-        # Get the main surface size
-        WIDTH = screen.get_width()
-        HEIGHT = screen.get_height()
-        
-        # Get the rotation mode from the Rotation object
-        self.turret_mode = rotationObject.mode
-        
-        # Launching the function according to the rotation mode
-        if self.turret_mode == "sentinel":
-            self.sentinel_mode(turretObject, mobsObject)
-        
-        if self.turret_mode == "alert":
-            self.alert_mode(turretObject)
-        
-        if self.turret_mode == "fire":
-            self.fire_mode(screen, turretObject,
-                           mobsObject, refs)
-        
-        # Turret positioning
-        turret_rect = self.turret_image.get_rect()
-        turret_rect.center = (WIDTH//2, HEIGHT//2)
-        
-        # Turret surface and rect rotation
-        rotated_surface = pygame.transform.rotate(self.turret_image, rotationObject.angle)
-        rotated_rect = rotated_surface.get_rect(center=turret_rect.center)
+            alpha: Interpolation factor (0.0 to 1.0)
+
+        Returns:
+            list: Rects of the drawn projectiles
+        """
+        live = np.flatnonzero(self.active)
+        if live.size == 0:
+            return []
         
-        # Display
-        screen.blit(rotated_surface, rotated_rect)
+        previous = self.previous_pos[live]
+        positions = previous + (self.pos[live] - previous) * alpha
         
-        # The angle value is incremented by a value defined by 
-        # the actual Rotation class mode
-        rotationObject.rotate()
+        rects = []
+        for (x, y), green in zip(positions.astype(int).tolist(), 
+                                 self.green[live].tolist()):
+            # Random values of the projectile radius add a flame effect
+            radius = self.rng.randint(2,9)
+            rects.append(pygame.draw.circle(screen, (255,green,0), (x, y), radius))
+        return rects
 
 class Thunder():
     """Makes lightning appear and thunder heard.
     
-    Lightning appears according to a defined probability index 
-    and for a limited random time, just like the time between 
-    the disappearance of lightning and the sound of thunder."""
+    The lightning bolts are scheduled events: the time until the 
+    next one follows the exponential distribution equivalent to a 
+    dice of self.probability per simulation step, rolled once the 
+    previous thunder is over. A bolt is displayed for a limited 
+    random time, and the thunder is heard after another random 
+    delay. Each event schedules the next one on self.weather, so 
+    that nothing is computed at the steps in between."""
     
     def __init__(self):
         self.path = "assets/images/storm.png"
-        self.img = pygame.image.load(self.path)
+        self.img = None # Loaded at the first lightning
+        self.rng = random.Random()
+        self.probability = 0.07 / 100 # Per roll of the former dice
+        self.reset(WeatherScheduler())
+        
+        # Function giving the current time in seconds, replaced 
+        # by the simulated time when run by the Simulation class
+        self.time_source = time.time
+    
+    def reset(self, weather:WeatherScheduler = None) -> None:
+        """Resets the lightning states and counters, no lightning 
+        or thunder is in progress
+
+        Args:
+            weather: Scheduler of the lightning events, the 
+            current one if None
+        """
+        if weather is not None:
+            self.weather = weather
+        elif self.event is not None:
+            self.weather.cancel(self.event)
+        self.event = None # Next scheduled event
         
         self.in_lightning = False
-        self.lightning_start_time = None
-        self.lightning_duration = None
         self.lightning_displayed = 0
+        self.after_lightning = False # Waiting for the thunder
         
+        self.flash = False # Lightning displayed at this step
+        self.thunder_end = 0.0 # End of the thunder sound
+    
+    def load(self) -> None:
+        """Loads the lightning image if it isn't already"""
+        if self.img is None:
+            self.img = assets.image(self.path, resolution.stretch)
+    
+    def schedule_lightning(self, time:float, dt:float) -> None:
+        """Schedules the next lightning bolt after a given time
+
+        Args:
+            time: Date from which the lightning can strike
+            dt: Duration of a simulation step, the period of the 
+            rolls of the former dice
+        """
+        delay = self.rng.expovariate(event_rate(self.probability, dt))
+        self.event = self.weather.schedule(time + delay, self.start_lightning)
+    
+    def start_lightning(self, time:float) -> None:
+        """A lightning bolt appears for a random duration"""
+        self.lightning_displayed += 1
+        self.in_lightning = True
+        self.event = self.weather.schedule(time + self.rng.uniform(0.2,1.0),
+                                           self.end_lightning)
+    
+    def end_lightning(self, time:float) -> None:
+        """The lightning disappears, no other lightning can take 
+        place before the thunder which is heard after a random 
+        delay"""
+        self.in_lightning = False
+        self.after_lightning = True
+        self.event = self.weather.schedule(time + self.rng.uniform(2.5,5.5),
+                                           self.play_thunder)
+    
+    def play_thunder(self, time:float) -> None:
+        """The thunder is heard, the next lightning is scheduled 
+        at the next update. The end of the sound is counted on the 
+        time source rather than asked to the mixer, so that a 
+        replayed session gives the same lightning"""
         self.after_lightning = False
-        self.after_lightning_start_time = None
-        self.after_lightning_duration = None
+        sounds.play_sound("thunder")
+        self.thunder_end = time + sounds.get_length("thunder")
+        self.event = None
     
-    def lightning_dice(self) -> bool:
-        """Function acting like a dice, if it returns True the 
-        lightning flash is displayed on the screen, if it returns 
-        False nothing is displayed. The lightning() function of 
-        this class only displays the lightning image according to 
-        the return of this function
+    def update(self, dt:float = 1/60) -> None:
+        """Runs the lightning events due at this simulation step
 
-        Returns:
-            bool: A boolean
-        """        
-        probability = 0.07
-        proba = probability / 100
-        
-        # A lightning bolt is being displayed, it will be 
-        # displayed for a time determined by 
-        # self.lightning_duration. After the time elapses, the 
-        # lightning disappears and the self.after_lightning 
-        # state variable is set to True
-        if self.in_lightning:
-            duration = time.time() - self.lightning_start_time
-            if duration <= self.lightning_duration: # In time
-                return True
-            
-            else: # Deadline
-                self.in_lightning = False
-                self.after_lightning_start_time = time.time()
-                self.after_lightning_duration = random.uniform(2.5,5.5)
-                self.after_lightning = True
-                return False
-        
-        # The lightning has just disappeared from the screen, 
-        # no other lightning must take place for a specific time, 
-        # in order to play the sound of thunder. The delay between 
-        # lightning and thunder is a random value in seconds :
-        # self.after_lightning_duration
-        if self.after_lightning:
-            duration = time.time() - self.after_lightning_start_time
-            if duration <= self.after_lightning_duration: # In time
-                return False
-            else: # Deadline
-                self.after_lightning = False
-                sounds.play_sound("thunder")
-                return False
-        
-        # We assume here that self.in_lightning and 
-        # self.after_lightning are False, we nevertheless wait 
-        # for the end of the "tunder" sound if it's being played
-        # to display a new lightning
-        if not sounds.in_playing("thunder"):
-            rand_num = random.random()
-            
-            # The probability is realized, the state variable 
-            # self.in_lightning is set to True
-            if rand_num < proba: # The probability is realized
-                self.lightning_displayed += 1
-                self.in_lightning = True
-                self.lightning_start_time = time.time()
-                self.lightning_duration = random.uniform(0.2,1.0)
-                return True
-            
-            # The probability isn't realized. No lightning
-            else:
-                self.in_lightning = False
-                return False
+        Args:
+            dt: Duration of the simulation step in seconds
+        """
+        if self.event is None:
+            self.schedule_lightning(max(self.thunder_end, self.time_source()), dt)
+        self.weather.run(self.time_source())
+        self.flash = self.in_lightning
+    
+    def draw(self, screen:pygame.surface.Surface) -> None:
+        """Display a lightning bolt on the screen if one is in 
+        progress at the last update
+
+        Args:
+            screen: The main Pygame surface where to draw
+        """
+        if self.flash:
+            self.load()
+            screen.blit(self.img, (0,0))
     
     def lightning(self, screen=pygame.surface.Surface) -> None:
-        """Display a lightning bolt on the screen according 
-        to the return from self.lightning_dice()
+        """Updates the lightning and displays it on the screen
 
         Args:
             screen: The main Pygame surface where to draw
         """        
-        if self.lightning_dice():
-            screen.blit(self.img, (0,0))
+        self.update()
+        self.draw(screen)
         
 thunder = Thunder()
 
@@ -611,103 +559,172 @@ def get_thunder():
 
 class MakeItRain():
     """Shows the rain animation on the screen as well as the 
-    effect of the wind on it"""
+    effect of the wind on it.
+    
+    The raindrops are particles which persist from one frame to 
+    the next. Their states (x, y, speed, length) are kept in NumPy 
+    arrays and all the drops are moved at once. The wind is a 
+    shear term: it pushes the drops to the left proportionally 
+    to their fall and tilts their trail.
+    """
     
-    def __init__(self, screen:pygame.surface.Surface):
+    def __init__(self, screen:pygame.surface.Surface,
+                 raindrop_intensity:int = 300):
         self.screen = screen
         self.WIDTH = self.screen.get_width()
         self.HEIGHT = self.screen.get_height()
         self.raindrop_color = (144, 153, 161)
         self.raindrop_thickness = 1
-        self.raindrop_intensity = 40 # Raindrops on screen
+        self.raindrop_intensity = raindrop_intensity # Raindrops on screen
+        # Pixels per second and pixels, at the render resolution
+        self.raindrop_speed = (resolution.length(500), resolution.length(900))
+        self.raindrop_length = (max(1, round(resolution.length(4))), 
+                                max(2, round(resolution.length(13))))
         self.in_wind = False # Wind animation in progress
-        self.wind_start_time = None
-        self.strong_wind_sound_played = 0
         self.strong_wind_displayed = 0
+        self.time_source = time.time # See Thunder.time_source
+        
+        # The gusts of wind are scheduled events, see Thunder. 
+        # A gust lasts 3 to 5 seconds
+        self.weather = WeatherScheduler()
+        self.wind_event = None # Next scheduled gust start or end
+        self.wind_probability = 0.12 / 100 # Per roll of the former dice
+        self.wind_duration = (3, 5)
+        
+        # Horizontal shift of the drops per pixel of fall. It 
+        # moves towards wind_shear during a gust and back to 0 
+        # afterwards
+        self.shear = 0.0
+        self.wind_shear = 1.0
+        self.shear_easing = 4.0 # Per second
+        
+        self.rng = np.random.default_rng()
+        self.generate_raindrops()
     
-    def generate_raindrop(self) -> dict:
-        """Generates the coordinates of a raindrop in a dict"""
-        
-        x = random.randint(0, self.WIDTH)
-        y = random.randint(0, self.HEIGHT)
-        speed = random.uniform(0.01, 0.08)
-        return {'x': x, 'y' : y, 'speed' : speed}
+    def generate_raindrops(self) -> None:
+        """Generates the states of all the raindrops, randomly 
+        spread over the screen"""
+        count = self.raindrop_intensity
+        self.x = self.rng.uniform(0, self.WIDTH, count)
+        self.y = self.rng.uniform(0, self.HEIGHT, count)
+        self.speed = self.rng.uniform(*self.raindrop_speed, count)
+        self.length = self.rng.integers(self.raindrop_length[0], 
+                                        self.raindrop_length[1] + 1, count)
     
-    def wind_dice(self) -> bool:
-        """Sets the probability for a wind effect to appear. The 
-        function returns True if the probability is realized, 
-        False otherwise 
+    def schedule_gust(self, time:float, dt:float) -> None:
+        """Schedules the next gust of wind after a given time
+
+        Args:
+            time: Date from which the wind can blow
+            dt: Duration of a simulation step, the period of the 
+            rolls of the former dice
+        """
+        rate = event_rate(self.wind_probability, dt)
+        self.wind_event = self.weather.schedule(time + self.rng.exponential(1 / rate),
+                                                self.start_gust)
+    
+    def start_gust(self, time:float) -> None:
+        """A gust of wind starts blowing for a random duration"""
+        self.strong_wind_displayed += 1
+        self.in_wind = True
+        sounds.play_sound("strong_wind")
+        duration = int(self.rng.integers(self.wind_duration[0], self.wind_duration[1] + 1))
+        self.wind_event = self.weather.schedule(time + duration, self.end_gust)
+    
+    def end_gust(self, time:float) -> None:
+        """The gust of wind is over, the next one is scheduled at 
+        the next update"""
+        self.in_wind = False
+        sounds.fadeout("strong_wind", 1000)
+        self.wind_event = None
+    
+    def advance(self, dt:float, wind:bool) -> None:
+        """Moves all the raindrops by one time step
+
+        Args:
+            dt: Duration of the step in seconds
+            wind: True if a gust of wind is blowing
+        """
+        # The shear smoothly follows the wind state
+        target = self.wind_shear if wind else 0.0
+        self.shear += (target - self.shear) * min(1.0, self.shear_easing * dt)
+        
+        fall = self.speed * dt
+        self.y += fall
+        self.x -= self.shear * fall
+        
+        # The drops which left the screen fall again from the top
+        out = self.y > self.HEIGHT
+        count = np.count_nonzero(out)
+        if count:
+            self.y[out] -= self.HEIGHT + self.raindrop_length[1]
+            self.x[out] = self.rng.uniform(0, self.WIDTH, count)
+        np.mod(self.x, self.WIDTH, out=self.x)
+    
+    def draw_drops(self) -> None:
+        """Draws the trail of all the raindrops. The pixels of 
+        the trails are written directly in the screen surface, 
+        one step of length at a time for all the drops"""
+        try:
+            pixels = pygame.surfarray.pixels2d(self.screen)
+        except ValueError: # Surface format not supported
+            self.draw_lines()
+            return
+        
+        color = self.screen.map_rgb(self.raindrop_color)
+        for step in range(self.raindrop_length[1] + 1):
+            visible = self.length >= step
+            px = (self.x[visible] - self.shear * step).astype(np.intp)
+            py = (self.y[visible] + step).astype(np.intp)
+            
+            inside = (px >= 0) & (px < self.WIDTH) & (py >= 0) & (py < self.HEIGHT)
+            for offset in range(self.raindrop_thickness):
+                pixels[np.minimum(px[inside] + offset, self.WIDTH - 1), 
+                       py[inside]] = color
+        del pixels # Unlocks the surface
+    
+    def draw_lines(self) -> None:
+        """Draws the raindrops one line at a time, used when the 
+        screen pixels can't be accessed directly"""
+        for x, y, length in zip(self.x, self.y, self.length):
+            pygame.draw.line(self.screen, self.raindrop_color, (x, y),
+                    (x - self.shear * length, y + length), self.raindrop_thickness)
+    
+    def update(self, dt:float = 1/60) -> None:
+        """Plays the rain sounds, runs the wind and lightning 
+        events due at this step and moves the raindrops by one 
+        simulation step
+
+        Args:
+            dt: Duration of the simulation step in seconds
         """
-        
-        # We establish a low probability value because the rain 
-        # function will be called each time through the main 
-        # Pygame loop, i.e. several dozen times per second 
-        # depending on the fps.
-        probability = 0.003
-        wind_duration = random.randint(3,5)
-        
-        # A wind effect is already being animated, we ensure that 
-        # it lasts a time determined by the value in seconds of 
-        # wind_duration
-        if self.in_wind:
-            duration = time.time() - self.wind_start_time
-            if duration <= wind_duration:
-                return True
-            else:
-                self.in_wind = False
-                return False
-        
-        # No wind effect is being animated, we calculate the 
-        # probability of realization.
-        proba = probability / 100
-        rand_num = random.random()
-        if rand_num < proba:
-            self.strong_wind_displayed += 1
-            self.in_wind = True
-            self.wind_start_time = time.time()
-            return True
-        else:
-            self.in_wind = False
-            return False
-    
-    def rain(self) -> None:
-        """Shows rain animation on screen"""
-        
-        #global strong_wind_soung_played
-        
         if not sounds.in_playing("rain"):
             sounds.play_sound("rain")
         if not sounds.in_playing("wind"):
             sounds.play_sound("wind")
         
-        # Generating coordinates of all raindrops
-        raindrops = [self.generate_raindrop() for _ in range(self.raindrop_intensity)]
+        # Gusts of wind
+        if self.wind_event is None:
+            self.schedule_gust(self.time_source(), dt)
+        self.weather.run(self.time_source())
         
-        # Random variation in the length of raindrops
-        raindrop_length = random.randint(4,13)
+        # Moving raindrops
+        self.advance(dt, self.in_wind)
         
-        # Drawing raindrops
-        for raindrop in raindrops:
-            if not self.wind_dice(): # No wind
-                self.strong_wind_soung_played = 0
-                sounds.fadeout("strong_wind", 1000)
-                pygame.draw.line(self.screen, self.raindrop_color,
-                        (raindrop['x'], raindrop['y']),
-                        (raindrop['x'], raindrop['y'] + raindrop_length), self.raindrop_thickness)
-            
-            else: # Wind
-                if not sounds.in_playing("strong_wind") and self.strong_wind_soung_played < 1:
-                    sounds.play_sound("strong_wind")
-                    self.strong_wind_soung_played += 1
-                pygame.draw.line(self.screen, self.raindrop_color,
-                        (raindrop['x'], raindrop['y']),
-                        (raindrop['x'] - raindrop_length, raindrop['y'] + raindrop_length), self.raindrop_thickness)
-            
-            #raindrop['y'] += raindrop['speed']
-            
-            if raindrop['y'] > self.HEIGHT:
-                raindrop['y'] = 0
-                raindrop['x'] = random.randint(0, self.WIDTH)
-        
-        # Probability roll for the display of lightning
-        thunder.lightning(self.screen)
\ No newline at end of file
+        # Lightning, on the same scheduler when run by the 
+        # Simulation class
+        thunder.update(dt)
+    
+    def draw(self) -> None:
+        """Shows the raindrops and the lightning on screen"""
+        self.draw_drops()
+        thunder.draw(self.screen)
+    
+    def rain(self, dt:float = 1/60) -> None:
+        """Shows rain animation on screen
+
+        Args:
+            dt: Time elapsed since the previous frame in seconds
+        """
+        self.update(dt)
+        self.draw()
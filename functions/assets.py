@@ -0,0 +1,310 @@
+"""
+assets.py - Assets module
+
+This module loads the images and sounds of the game on first use 
+rather than at import time, and keeps on disk the sprites already 
+resized by the program and the sounds already decoded, so that 
+they don't have to be decoded from PNG or OGG at each launch.
+"""
+import os
+import struct
+import hashlib
+from functions.display import pygame
+
+class AssetCache():
+    """Disk cache of resized sprites and decoded sounds.
+
+    The first time a sprite is requested, it is loaded from its PNG
+    file and resized, then its pixels are saved in a raw file whose
+    name is made of the hash of the source file and of the scale
+    factor. The next launches directly build the surface from these
+    pixels with pygame.image.frombuffer(). A modified source file
+    has another hash, so its old entries are simply no longer used.
+
+    Raw file format : a header (magic, width, height, pixel
+    format) followed by the pixels, 4 bytes (RGBA) or 3 bytes (RGB)
+    per pixel.
+
+    The sounds are kept the same way, as the PCM samples decoded
+    by the mixer. A PCM file is only valid for the mixer format
+    (frequency, sample size, channels) it was decoded for, which
+    is part of its name and of its header. It can also be read
+    piece by piece to stream a long sound (see SoundStream).
+    """
+    magic = b"TRC1"
+    header = struct.Struct("<4sII4s")
+    pcm_magic = b"TPC1"
+    pcm_header = struct.Struct("<4sIhH") # Frequency, size, channels
+
+    def __init__(self, folder:str = ".cache/assets", enabled:bool = True):
+        self.folder = folder
+        self.enabled = enabled
+        self.hashes = {} # Source path : hash of its content
+
+        # Counters of the current session
+        self.hits = 0
+        self.misses = 0
+
+    def file_hash(self, path:str) -> str:
+        """Returns the hash of the content of a file, computed
+        once per session"""
+        if path not in self.hashes:
+            with open(path, "rb") as file:
+                self.hashes[path] = hashlib.sha1(file.read()).hexdigest()
+        return self.hashes[path]
+
+    def cache_path(self, path:str, scale:float, alpha:bool) -> str:
+        """Path of the raw file of a sprite resized by 'scale'"""
+        if isinstance(scale, tuple):
+            scale = "x".join(f"{value:g}" for value in scale)
+        else:
+            scale = f"{scale:g}"
+        name = f"{self.file_hash(path)}_{scale}_{'rgba' if alpha else 'rgb'}.raw"
+        return os.path.join(self.folder, name)
+
+    def read(self, cache_path:str) -> pygame.surface.Surface:
+        """Builds a surface from a raw file, returns None if the
+        file doesn't exist or is invalid"""
+        try:
+            with open(cache_path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        # A truncated or corrupted file is a cache miss, it will be 
+        # written again
+        if len(data) < self.header.size:
+            return None
+        try:
+            magic, width, height, fmt = self.header.unpack_from(data)
+            fmt = fmt.decode().strip()
+        except (struct.error, UnicodeDecodeError):
+            return None
+        pixels = data[self.header.size:]
+        if (magic != self.magic or fmt not in ("RGB", "RGBA") or 
+            len(pixels) != width * height * len(fmt)):
+            return None
+
+        return pygame.image.frombuffer(pixels, (width, height), fmt)
+
+    def write(self, cache_path:str, surface:pygame.surface.Surface,
+              alpha:bool) -> None:
+        """Saves the pixels of a surface in a raw file"""
+        fmt = "RGBA" if alpha else "RGB"
+        pixels = pygame.image.tobytes(surface, fmt)
+        header = self.header.pack(self.magic, surface.get_width(),
+                                  surface.get_height(), fmt.ljust(4).encode())
+
+        # Written under a temporary name then renamed, so that an
+        # interrupted launch never leaves a truncated file. The 
+        # name is unique to the process, several processes can 
+        # fill the cache at the same time (benchmarks/sweep.py)
+        os.makedirs(self.folder, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(header + pixels)
+        os.replace(temp_path, cache_path)
+
+    def load(self, path:str, scale:float = 1.0,
+             alpha:bool = True) -> pygame.surface.Surface:
+        """Returns the sprite of 'path' resized by 'scale'.
+
+        The surface is converted to the display format if the
+        display is initialized.
+
+        Args:
+            path: Path of the PNG file
+            scale: Resizing factor, or (x, y) factors 
+            (pygame.transform.smoothscale_by)
+            alpha: True to keep the transparency of the sprite
+
+        Returns:
+            pygame.surface.Surface: The resized sprite
+        """
+        surface = None
+        if self.enabled:
+            cache_path = self.cache_path(path, scale, alpha)
+            surface = self.read(cache_path)
+
+        if surface is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            surface = pygame.image.load(path)
+            if scale != 1.0:
+                surface = pygame.transform.smoothscale_by(surface, scale)
+            if self.enabled:
+                self.write(cache_path, surface, alpha)
+
+        # The surface built by frombuffer() shares the memory of the
+        # bytes read, the conversion gives it its own pixels
+        if pygame.display.get_surface() is not None:
+            return surface.convert_alpha() if alpha else surface.convert()
+        return surface.copy()
+
+    def pcm_path(self, path:str, mixer_format:tuple) -> str:
+        """Path of the PCM file of a sound decoded for a mixer
+        format (frequency, size, channels)"""
+        frequency, size, channels = mixer_format
+        name = f"{self.file_hash(path)}_{frequency}_{size}_{channels}.pcm"
+        return os.path.join(self.folder, name)
+
+    def valid_pcm(self, cache_path:str, mixer_format:tuple) -> bool:
+        """Checks the header of a PCM file"""
+        try:
+            with open(cache_path, "rb") as file:
+                data = file.read(self.pcm_header.size)
+        except OSError:
+            return False
+        if len(data) != self.pcm_header.size:
+            return False
+        magic, *fmt = self.pcm_header.unpack(data)
+        return magic == self.pcm_magic and tuple(fmt) == tuple(mixer_format)
+
+    def write_pcm(self, cache_path:str, sound:pygame.mixer.Sound,
+                  mixer_format:tuple) -> None:
+        """Saves the decoded samples of a sound in a PCM file"""
+        header = self.pcm_header.pack(self.pcm_magic, *mixer_format)
+
+        os.makedirs(self.folder, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(header)
+            file.write(sound.get_raw())
+        os.replace(temp_path, cache_path)
+
+    def decode_pcm(self, path:str, mixer_format:tuple) -> str:
+        """Makes sure that the decoded samples of a sound are in 
+        the cache, the sound is only decoded if they aren't. The 
+        mixer must be initialized
+
+        Args:
+            path: Path of the sound file
+            mixer_format: Format returned by pygame.mixer.get_init()
+
+        Returns:
+            str: Path of the PCM file, the samples start after 
+            self.pcm_header.size bytes
+        """
+        cache_path = self.pcm_path(path, mixer_format)
+        if self.valid_pcm(cache_path, mixer_format):
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.write_pcm(cache_path, pygame.mixer.Sound(path), mixer_format)
+        return cache_path
+
+    def load_sound(self, path:str) -> pygame.mixer.Sound:
+        """Returns a sound, built from its decoded samples when 
+        they are in the cache. The mixer must be initialized
+
+        Args:
+            path: Path of the sound file
+        """
+        if not self.enabled:
+            return pygame.mixer.Sound(path)
+
+        mixer_format = pygame.mixer.get_init()
+        cache_path = self.pcm_path(path, mixer_format)
+        if self.valid_pcm(cache_path, mixer_format):
+            self.hits += 1
+            with open(cache_path, "rb") as file:
+                file.seek(self.pcm_header.size)
+                return pygame.mixer.Sound(buffer=file.read())
+
+        self.misses += 1
+        sound = pygame.mixer.Sound(path)
+        self.write_pcm(cache_path, sound, mixer_format)
+        return sound
+
+    def clear(self) -> None:
+        """Deletes all the raw and PCM files of the cache folder"""
+        if not os.path.isdir(self.folder):
+            return
+        for name in os.listdir(self.folder):
+            if name.endswith((".raw", ".pcm")):
+                os.remove(os.path.join(self.folder, name))
+
+asset_cache = AssetCache()
+
+def get_asset_cache() -> AssetCache:
+    """ Allows other modules to retrieve the asset cache object """
+    return asset_cache
+
+class AssetManager():
+    """Central access point to the images and sounds of the game.
+    
+    Nothing is loaded in advance: an asset is loaded the first 
+    time it is requested, the images through the AssetCache, then 
+    kept in memory for the next requests. The assets known to be 
+    needed early can be loaded beforehand with prefetch().
+    """
+    def __init__(self, asset_cache:AssetCache):
+        self.asset_cache = asset_cache
+        self.images = {} # (path, scale, alpha) : Surface
+        self.sounds = {} # path : Sound
+
+    def image(self, path:str, scale:float = 1.0,
+              alpha:bool = True) -> pygame.surface.Surface:
+        """Returns an image, loaded and resized on first use
+
+        Args:
+            path: Path of the PNG file
+            scale: Resizing factor, or (x, y) factors
+            alpha: True to keep the transparency of the image
+
+        Returns:
+            pygame.surface.Surface: The image
+        """
+        key = (path, scale, alpha)
+        if key not in self.images:
+            self.images[key] = self.asset_cache.load(path, scale, alpha)
+        return self.images[key]
+
+    def init_mixer(self) -> None:
+        """Initializes the mixer if it isn't already"""
+        if pygame.mixer.get_init() is None:
+            pygame.mixer.init()
+
+    def sound(self, path:str) -> pygame.mixer.Sound:
+        """Returns a sound, decoded on first use (or read from the 
+        decoded samples of the AssetCache)
+
+        Args:
+            path: Path of the sound file
+        """
+        if path not in self.sounds:
+            self.init_mixer()
+            self.sounds[path] = self.asset_cache.load_sound(path)
+        return self.sounds[path]
+
+    def prefetch(self, images:list = (), sounds:list = ()) -> None:
+        """Loads assets in advance
+
+        Args:
+            images: Paths of the images, or (path, scale) or
+            (path, scale, alpha) tuples
+            sounds: Paths of the sounds
+        """
+        for image in images:
+            if isinstance(image, str):
+                image = (image,)
+            self.image(*image)
+
+        for path in sounds:
+            self.sound(path)
+
+    def forget(self) -> None:
+        """Releases all the assets kept in memory"""
+        self.images.clear()
+        self.sounds.clear()
+
+    def loaded(self) -> tuple:
+        """Returns the number of images and sounds loaded"""
+        return len(self.images), len(self.sounds)
+
+assets = AssetManager(asset_cache)
+
+def get_assets() -> AssetManager:
+    """ Allows other modules to retrieve the asset manager object """
+    return assets
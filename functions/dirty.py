@@ -0,0 +1,86 @@
+"""
+dirty.py - Dirty rectangles module
+
+This module refreshes only the parts of the screen which changed
+since the previous frame instead of the whole window. The static
+layer (background and turret bases) is kept in a surface from
+which the regions of the last frame are restored, then only these
+regions and the new ones are sent to the display.
+"""
+from functions.display import pygame
+
+class DirtyRects():
+    """Tracks the regions drawn on the screen between two frames.
+
+    Each frame, restore() erases the elements drawn at the previous
+    frame by copying back the matching regions of the static layer,
+    the scene is drawn over it and record() receives the rects of
+    everything that was drawn. present() then updates the display
+    with the erased and the drawn regions only.
+
+    Outside these regions the screen always holds the static layer,
+    so the elements can move freely. When the whole screen has been
+    redrawn (first frame, rain, new static layer...) invalidate()
+    makes the next present() a full flip.
+    """
+    def __init__(self, screen:pygame.surface.Surface,
+                 static:pygame.surface.Surface):
+        self.screen = screen
+        self.screen_rect = screen.get_rect()
+        self.static = static # Background layer of the same size
+        self.drawn = [] # Rects drawn at the last frame
+        self.dirty = [] # Rects changed since the last present()
+        self.full = True # The next present() updates the whole screen
+
+        # Counters of the session
+        self.frames = 0
+        self.full_frames = 0
+        self.area = 0 # Pixels sent by the partial updates
+
+    def invalidate(self) -> None:
+        """The whole screen must be sent at the next present()"""
+        self.full = True
+        self.drawn = []
+        self.dirty = []
+
+    def restore(self) -> None:
+        """Erases the elements drawn at the previous frame"""
+        if self.full:
+            self.screen.blit(self.static, (0, 0))
+            return
+
+        blits = [(self.static, rect, rect) for rect in self.drawn]
+        self.screen.blits(blits, doreturn=False)
+        self.dirty += self.drawn
+
+    def record(self, rects:list) -> None:
+        """Records the rects drawn during the frame
+
+        Args:
+            rects: Rects returned by the drawing functions
+        """
+        clip = self.screen_rect.clip
+        self.drawn = [rect for rect in map(clip, rects) if rect.width and rect.height]
+        self.dirty += self.drawn
+
+    def present(self) -> None:
+        """Updates the display with the changed regions, or the
+        whole screen after invalidate()"""
+        self.frames += 1
+        if self.full:
+            pygame.display.flip()
+            self.full_frames += 1
+            self.full = False
+        else:
+            pygame.display.update(self.dirty)
+            self.area += sum(rect.width * rect.height for rect in self.dirty)
+        self.dirty = []
+
+    def coverage(self) -> float:
+        """Returns the mean fraction of the screen sent by the
+        partial updates"""
+        partial = self.frames - self.full_frames
+        if partial == 0:
+            return 1.0
+        screen_area = self.screen_rect.width * self.screen_rect.height
+        return self.area / (partial * screen_area)
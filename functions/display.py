@@ -11,30 +11,65 @@ functions
 import random
 import os
 import time
+from collections import OrderedDict
 import pygame
-from functions.geometry import get_distance
+from functions.geometry import np, get_distance, sweep_cells
 from functions.sound import SoundManager, get_sounds
+from functions.spatial import SpatialGrid
+from functions.mobtable import MobTable, DESTROYED
+from functions.assets import get_assets
+from functions.resolution import get_resolution
 
 start_time = time.time()
 sounds = get_sounds()
+assets = get_assets()
+resolution = get_resolution()
 class Mobs():
     """Class generating mobs, make them appear 
     on the screen when you click and make them disappear when 
     they are destroyed. All mobs displayed on the screen are 
-    contained in a list self.living_mobs including their
-    respective position and other informations. 
+    stored in a MobTable (self.table), one NumPy column per 
+    attribute, so that detection and display go through 
+    contiguous arrays. Each mob receives a unique integer id 
+    under which it is also registered in a uniform grid 
+    (self.grid), so that proximity checks and detection only look 
+    at the mobs located in the cells they touch (see 
+    sweep_candidates()). The turrets designate the mob they 
+    target by its id.
     The instantiated object of this class can be shared and 
     manipulated by all parties concerned so that they are 
-    aware of the number of mobs present and their position
+    aware of the number of mobs present and their position.
+    The mob sprites are only loaded at the first spawn, resized 
+    for the current resolution (see resolution.py), as well as 
+    the distances in pixels.
+    The sprites and the debris are drawn from self.rng, which can 
+    be seeded to reproduce a session.
     """    
     def __init__(self):
         self.folder = "assets/images/sprites"
         self.size_reduction = 0.10
-        self.potential_mobs = self.loading_sprites()
-        self.living_mobs = []
+        self.potential_mobs = None # Loaded on first use
+        self.debris_path = self.folder + "/destroyed.png"
+        self.debris_variants = 8 # Number of debris orientations
+        self.debris = None # Loaded on first use
+        self.table = MobTable()
+        self.grid = SpatialGrid(cell_size=64)
         self.max_living_mobs = 10
         self.turret_base_proximity = 100
-        self.in_target = None
+        # Below this number of mobs, the detection tests all of 
+        # them : listing the swept cells costs more (about 500 
+        # mobs with 9 turrets, see benchmarks/main_loop.py)
+        self.sweep_threshold = 512
+        self.rng = random.Random()
+        self.destroyed_count = 0 # Mobs destroyed since the last clear()
+    
+    def __len__(self) -> int:
+        return len(self.table)
+    
+    @property
+    def positions(self) -> np.ndarray:
+        """Coordinates of all the living mobs, array of shape (n, 2)"""
+        return self.table.positions
     
     def how_many_sprites(self, folder:str) -> int:
         """Determines how many mob .png files are in the folder.
@@ -62,7 +97,8 @@ class Mobs():
     def loading_sprites(self, coef:float = 0.10) -> list:
         """Loads all the mob sprites contained in the folder 
         which can potentially appear during a click. Sprites 
-        are also resized by reducing their size by a 'coef' factor
+        are also resized by reducing their size by a 'coef' factor, 
+        adapted to the render resolution
 
         Args:
             coef : Reduction size factor
@@ -70,29 +106,98 @@ class Mobs():
         Returns:
             list: All potential mobs
         """
-        coef = self.size_reduction        
+        coef = resolution.scale(self.size_reduction)
         mobs = []
         
         for i in range(1, self.how_many_sprites(self.folder)+1):
             path = self.folder + f"/mob_{i}.png"
-            img = pygame.image.load(path)
-            img = pygame.transform.smoothscale_by(img, coef)
+            img = assets.image(path, coef)
             mobs.append(img)
         
         return mobs
     
-    def mobs_gen(self) -> pygame.surface.Surface:
+    def loading_debris(self) -> list:
+        """Builds the pool of destroyed mob sprites. The image is 
+        reduced by the same factor as the living mobs in order to 
+        preserve the coherence, then rotated at 
+        self.debris_variants angles so that the debris seem 
+        different for each destruction
+
+        Returns:
+            list: All the debris variants
+        """
+        img = assets.image(self.debris_path, resolution.scale(self.size_reduction))
+        angles = np.linspace(1, 270, self.debris_variants)
+        
+        return [pygame.transform.rotate(img, angle) for angle in angles]
+
+    def load(self) -> None:
+        """Loads the mob and debris sprites if they aren't already"""
+        if self.potential_mobs is None:
+            self.potential_mobs = self.loading_sprites()
+        if self.debris is None:
+            self.debris = self.loading_debris()
+
+    def mobs_gen(self) -> int:
         """Generates mobs randomly so they can be displayed
         on click
 
         Returns:
-            pygame.surface.Surface: A Surface containing the mob
+            int: Index of the mob sprite in self.potential_mobs
         """    
-        mobs = self.potential_mobs
-        mob = random.choice(mobs)
+        self.load()
+        mob = self.rng.randrange(len(self.potential_mobs))
     
         return mob
     
+    def sprite_image(self, row:int) -> pygame.surface.Surface:
+        """Returns the sprite displayed by a row of the table, a 
+        mob sprite or a debris sprite according to its state"""
+        table = self.table
+        if table.state[row] == DESTROYED:
+            return self.debris[table.sprite[row]]
+        return self.potential_mobs[table.sprite[row]]
+    
+    def position(self, mob_id:int) -> pygame.math.Vector2:
+        """Returns the coordinates of a mob, None if it no longer 
+        exists
+
+        Args:
+            mob_id : Id of the mob
+        """
+        row = self.table.row(mob_id)
+        if row is None:
+            return None
+        x, y = self.table.pos[row]
+        return pygame.math.Vector2(x, y)
+    
+    def is_destroyed(self, mob_id:int) -> bool:
+        """Returns True if a mob no longer exists or is already 
+        destroyed (debris)
+
+        Args:
+            mob_id : Id of the mob
+        """
+        row = self.table.row(mob_id)
+        return row is None or self.table.state[row] == DESTROYED
+    
+    def draw(self, screen:pygame.surface.Surface) -> list:
+        """Displays all the living mobs in a single blits() call
+
+        Args:
+            screen : The main surface on which to draw
+
+        Returns:
+            list: Rects of the drawn sprites
+        """
+        table = self.table
+        if not table.count:
+            return []
+        
+        topleft = table.rect[:table.count, :2].tolist()
+        return screen.blits([(self.sprite_image(row), topleft[row]) 
+                             for row in range(table.count)])
+    
     def too_close_to_base(self, rect:pygame.Rect, pos:tuple) -> bool:
         """Checks if the mob's position isn't too close to the 
         turret base
@@ -106,7 +211,7 @@ class Mobs():
         """
         # The rect base is slightly inflated to also include 
         # its proximity
-        proximity = self.turret_base_proximity
+        proximity = resolution.length(self.turret_base_proximity)
         rect = rect.inflate(proximity,proximity)
         
         if rect.collidepoint(pos[0], pos[1]):
@@ -124,32 +229,67 @@ class Mobs():
         Returns:
             bool: True if too close, False otherwise
         """        
-        proximity = 50
-        if len(self.living_mobs) >= 1:
-            for mob in self.living_mobs:
-                rect = mob['rect'].inflate(proximity, proximity)
-                if rect.collidepoint(pos[0], pos[1]):
-                    return True
-            return False
+        proximity = resolution.length(50)
+        
+        # Only the mobs registered in the cells around the cursor 
+        # can be close enough to it
+        area = pygame.Rect(0, 0, proximity, proximity)
+        area.center = (pos[0], pos[1])
+        
+        for mob_id in self.grid.query_rect(area):
+            rect = pygame.Rect(self.table.rect[self.table.row(mob_id)])
+            rect = rect.inflate(proximity, proximity)
+            if rect.collidepoint(pos[0], pos[1]):
+                return True
+        return False
     
-    def add_mob(self, screen:pygame.surface.Surface, pos:tuple,
-                turret_base:pygame.surface.Surface, refs:dict):
-        """Adds a mob to the list of mobs to display 
-        (self.living_mobs). 
+    def sweep_candidates(self, centers:np.ndarray, start_angles:np.ndarray,
+                         end_angles:np.ndarray, rays:np.ndarray,
+                         radius:float) -> np.ndarray:
+        """Returns the rows of the mobs registered in the grid 
+        cells swept by rotating rays during a step. These are the 
+        only mobs that the detection has to test (see sweep_hits()).
+
+        Args:
+            centers : Array of shape (n, 2) of the turrets centers
+            start_angles : Angles at the start of the step
+            end_angles : Angles at the end of the step
+            rays : Array of shape (n, 3) of the lateral offsets, 
+            start and end distances of the rays
+            radius : Radius of the mobs for the detection
+
+        Returns:
+            np.ndarray: Rows of the candidates in self.table, in 
+            the order of the table
+        """
+        if len(self.table) < self.sweep_threshold:
+            return np.arange(len(self.table))
+        
+        # A mob is registered in the cell holding its center
+        cells = sweep_cells(centers, start_angles, end_angles,
+                            rays[:, 0], rays[:, 1], rays[:, 2],
+                            radius, self.grid.cell_size)
+        rows = sorted(self.table.row(mob_id) 
+                      for mob_id in self.grid.query_cells(cells))
+        
+        return np.array(rows, dtype=np.intp)
+    
+    def add_mob(self, pos:tuple, turret_bases:list, refs:dict) -> int:
+        """Adds a mob to the table of mobs to display 
+        (self.table). 
 
         Args:
-            screen : The main surface on which to draw
             pos : Cursor position when clicked
-            turret_base : Get the rect of the surface of the turret 
-            base to ensure that no mob can appear on it or in its 
+            turret_bases : Rects of the turret bases, to ensure 
+            that no mob can appear on one of them or in its 
             direct vicinity
+            refs : Reference points of the first turret
+
+        Returns:
+            int: Id of the new mob, None if it couldn't appear
         """
-        WIDTH = screen.get_width()
-        HEIGHT = screen.get_height()
-        
-        turret_base_rect = turret_base.get_rect()
-        turret_base_rect.center = (WIDTH//2, HEIGHT//2)
-        close_to_base = self.too_close_to_base(turret_base_rect, pos)
+        close_to_base = any(self.too_close_to_base(rect, pos) 
+                            for rect in turret_bases)
         
         close_to_mob = self.too_close_to_mob(pos)
         
@@ -159,44 +299,103 @@ class Mobs():
         # exceed the value of self.max_living_mobs
         # 2) The mob must not be too close to the turret base
         # 3) The mob must not be too close to another mob
-        if (len(self.living_mobs) < self.max_living_mobs and not 
+        if (len(self.table) < self.max_living_mobs and not 
             close_to_base and not close_to_mob):
-            if not sounds.in_playing("spawn"):
-                sounds.play_sound("spawn")
-            mob = self.mobs_gen()
+            sounds.play_sound("spawn")
+            sprite = self.mobs_gen()
             pos_x, pos_y = pos
             dist = get_distance(refs["cannon"], (pos_x, pos_y))
+            rect = self.potential_mobs[sprite].get_rect(center=(pos_x, pos_y))
             
-            new_mob = {'image':mob, 
-                       'rect':mob.get_rect(center=(pos_x, pos_y)),
-                       'pos' : pygame.math.Vector2(pos_x, pos_y),
-                       'dist' : int(dist)}
-            
-            self.living_mobs.append(new_mob)
+            mob_id = self.table.add((pos_x, pos_y), rect, sprite, int(dist))
+            self.grid.insert(mob_id, rect)
+            return mob_id
+        return None
     
-    def destroyed_mob(self):
+    def destroyed_mob(self, mob_id:int) -> bool:
         """Replaces the image of the mob targeted by a destroyed 
         mob sprite, this allows the turret to remain aligned with 
         the target while the aniamtion of the explosion ends: 
         technically the target is not yet deleted 
+
+        Args:
+            mob_id : Id of the targeted mob
+
+        Returns:
+            bool: False if the mob no longer exists or was already 
+            destroyed (by another turret)
+        """
+        return bool(self.destroyed_mobs(np.array([mob_id]))[0])
+    
+    def destroyed_mobs(self, mob_ids:np.ndarray) -> np.ndarray:
+        """Replaces the images of several mobs by destroyed mob 
+        sprites at once (see destroyed_mob())
+
+        Args:
+            mob_ids : Ids of the targeted mobs, a mob can appear 
+            several times
+
+        Returns:
+            np.ndarray: For each id, True if its mob was destroyed 
+            by this call, False if it no longer exists, was 
+            already destroyed or appears earlier in mob_ids
         """
-        # The size of the image of the destroyed mob is reduced by 
-        # a factor identical to that of living mobs in order to 
-        # preserve the coherence, the image also undergoes a random 
-        # rotation so that the debrits seem different for each destruction
-        for idx, mob in enumerate(self.living_mobs.copy()):
-            if mob['pos'] == self.in_target:
-                img = pygame.image.load("assets/images/sprites/destroyed.png")
-                img = pygame.transform.smoothscale_by(img, self.size_reduction)
-                img = pygame.transform.rotate(img, random.randint(1,270))
-                self.living_mobs[idx]['image'] = img
-    
-    def kill_mob(self):
+        # The debris are picked at random in a pool of already 
+        # resized and rotated sprites, nothing is loaded or 
+        # transformed at the moment of the impact
+        self.load()
+        table = self.table
+        rows = table.rows(mob_ids)
+        
+        # Several turrets can hit the same mob, only its first 
+        # hit destroys it
+        destroyed = np.zeros(len(mob_ids), dtype=bool)
+        _, first = np.unique(mob_ids, return_index=True)
+        destroyed[first] = True
+        destroyed &= rows >= 0
+        destroyed[destroyed] = table.state[rows[destroyed]] != DESTROYED
+        
+        rows = rows[destroyed]
+        if rows.size == 0:
+            return destroyed
+        
+        sprites = np.array([self.rng.randrange(len(self.debris)) 
+                            for _ in range(rows.size)])
+        table.sprite[rows] = sprites
+        table.state[rows] = DESTROYED
+        self.destroyed_count += rows.size
+        
+        # The rotated debris are bigger than the mobs, they are 
+        # recentered on them and their new areas are registered
+        rects = table.rect[rows]
+        sizes = np.array([debris.get_size() for debris in self.debris])[sprites]
+        rects[:, :2] += rects[:, 2:] // 2 - sizes // 2
+        rects[:, 2:] = sizes
+        table.rect[rows] = rects
+        for mob_id, rect in zip(mob_ids[destroyed].tolist(), rects.tolist()):
+            self.grid.insert(mob_id, pygame.Rect(rect))
+        
+        return destroyed
+    
+    def clear(self) -> None:
+        """Deletes all the mobs and resets the counter of 
+        destroyed mobs"""
+        self.table.clear()
+        self.grid.clear()
+        self.destroyed_count = 0
+    
+    def kill_mob(self, mob_id:int):
         """The targeted mob is definitely destroyed and deleted 
-        from the display"""
-        for idx, mob in enumerate(self.living_mobs.copy()):
-            if mob['pos'] == self.in_target:
-                del self.living_mobs[idx]
+        from the display
+
+        Args:
+            mob_id : Id of the targeted mob
+        """
+        if mob_id not in self.table:
+            return
+        
+        self.table.remove(mob_id)
+        self.grid.remove(mob_id)
 
 mobs = Mobs()
 def get_mobs():
@@ -206,13 +405,14 @@ def turret_base_sprite(coef:float = 0.47) -> pygame.surface.Surface:
     """Loads and resizes the turret base sprite
 
     Args:
-        coef : Reduction factor value. Defaults to 0.5.
+        coef : Reduction factor value at the reference 
+        resolution. Defaults to 0.47.
 
     Returns:
         pygame.surface.Surface: _description_
     """    
-    base_sprite = pygame.image.load("assets/images/sprites/turret_base.png").convert_alpha()
-    base_sprite = pygame.transform.smoothscale_by(base_sprite, coef)
+    base_sprite = assets.image("assets/images/sprites/turret_base.png", 
+                               resolution.scale(coef))
     
     return base_sprite
 
@@ -222,10 +422,10 @@ class TurretSprites():
     sentinel, alert, fire.
     """    
     def __init__(self):
-        self.turret_sprites = {
-        "turret_sentinel" : pygame.image.load("assets/images/sprites/turret_sentinel.png").convert_alpha(),
-        "turret_alert" : pygame.image.load("assets/images/sprites/turret_alert.png").convert_alpha(),
-        "turret_fire" : pygame.image.load("assets/images/sprites/turret_fire.png").convert_alpha()}
+        self.paths = {
+        "turret_sentinel" : "assets/images/sprites/turret_sentinel.png",
+        "turret_alert" : "assets/images/sprites/turret_alert.png",
+        "turret_fire" : "assets/images/sprites/turret_fire.png"}
         
         self.resize()
         
@@ -234,14 +434,151 @@ class TurretSprites():
         self.turret_fire = self.turret_sprites["turret_fire"]
         
     def resize(self, coef:float = 0.65):
-        """Resize sprites according to a factor value (coef)
+        """Loads the sprites resized according to a factor value 
+        (coef), from the asset cache when available
 
         Args:
-            coef : Reduction size factor
+            coef : Reduction size factor at the reference resolution
         """        
-        for key, img in self.turret_sprites.copy().items():
-            resized_sprite = pygame.transform.smoothscale_by(img, coef)
-            self.turret_sprites[key] = resized_sprite
+        coef = resolution.scale(coef)
+        self.turret_sprites = {key: assets.image(path, coef) 
+                               for key, path in self.paths.items()}
+
+class RotatedSpriteCache():
+    """Keeps the rotated surfaces of the turret sprites so that 
+    pygame.transform.rotate() isn't called at each frame.
+    
+    The angles are quantized in steps of 'step' degrees, or of 
+    the step of the mode in mode_steps, and a rotated surface is 
+    stored for each (sprite mode, quantized angle) pair. The 
+    cache is bounded to max_bytes of pixels (unbounded if None), 
+    when it's full the least recently used surfaces are evicted 
+    (LRU).
+    
+    A rotated turret sprite weighs about 250 KiB at the reference 
+    resolution, so a full turn of one mode costs about 88 MiB at 
+    1 degree. The sentinel mode sweeps the whole turn again and 
+    again: any LRU smaller than its turn would miss at every 
+    lookup. It is quantized every 3 degrees by default, a turn 
+    of about 29 MiB, and the modes which turn slowly (alert) or 
+    not at all (fire) keep the rest of the budget at 1 degree. 
+    The modes missing from cached_modes aren't cached, they are 
+    rotated at their exact angle at each frame (about 0.1 ms per 
+    sprite).
+    """
+    def __init__(self, max_bytes:int = 48 * 2**20, step:float = 1.0,
+                 mode_steps:dict = None,
+                 cached_modes:tuple = ("sentinel", "alert", "fire")):
+        self.max_bytes = max_bytes
+        self.cached_modes = cached_modes
+        if mode_steps is None:
+            mode_steps = {"sentinel" : 3.0}
+        
+        # Number of quantized angles in a turn, for each mode
+        self.turn_steps = {mode : int(round(360 / mode_steps.get(mode, step))) 
+                           for mode in ("sentinel", "alert", "fire")}
+        self.surfaces = OrderedDict()
+        self.bytes = 0 # Pixels of the cached surfaces
+        
+        # Counters displayed in debug mode
+        self.hits = 0
+        self.misses = 0
+    
+    def quantize(self, mode:str, angle:float) -> int:
+        """Returns the index of the closest quantized angle of a 
+        mode"""
+        steps = self.turn_steps[mode]
+        return int(round((angle % 360) * steps / 360)) % steps
+    
+    def rotate(self, mode:str, image:pygame.surface.Surface,
+               index:int) -> pygame.surface.Surface:
+        """Rotates a sprite by a quantized angle of its mode"""
+        return pygame.transform.rotate(image, index * 360 / self.turn_steps[mode])
+    
+    def store(self, key:tuple, surface:pygame.surface.Surface) -> None:
+        """Adds a surface to the cache and evicts the least 
+        recently used ones beyond max_bytes"""
+        self.surfaces[key] = surface
+        self.bytes += surface.get_pitch() * surface.get_height()
+        
+        while self.max_bytes is not None and self.bytes > self.max_bytes:
+            _, evicted = self.surfaces.popitem(last=False)
+            self.bytes -= evicted.get_pitch() * evicted.get_height()
+    
+    def get(self, mode:str, image:pygame.surface.Surface,
+            angle:float) -> pygame.surface.Surface:
+        """Returns the sprite rotated by the quantized angle, or 
+        by the exact angle if its mode isn't cached
+
+        Args:
+            mode : Sprite mode ('sentinel', 'alert', 'fire')
+            image : Sprite to rotate if it's not in the cache
+            angle : Angle of rotation in degrees
+
+        Returns:
+            pygame.surface.Surface: The rotated sprite
+        """
+        # Not a cache lookup, the counters are left unchanged
+        if mode not in self.cached_modes:
+            return pygame.transform.rotate(image, angle)
+        
+        key = (mode, self.quantize(mode, angle))
+        
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        
+        self.misses += 1
+        surface = self.rotate(mode, image, key[1])
+        self.store(key, surface)
+        
+        return surface
+    
+    def prewarm(self, turretObject, modes:tuple = None) -> None:
+        """Rotates in advance the sprites of the given modes for 
+        all the quantized angles. The cache must be able to hold 
+        a full turn of each mode (see max_bytes), otherwise the 
+        first ones are evicted.
+
+        Args:
+            turretObject : TurretSprites object
+            modes : Sprite modes to prewarm, self.cached_modes if 
+            None
+        """
+        if modes is None:
+            modes = self.cached_modes
+        for mode in modes:
+            image = getattr(turretObject, f"turret_{mode}")
+            for index in range(self.turn_steps[mode]):
+                key = (mode, index)
+                if key not in self.surfaces:
+                    self.store(key, self.rotate(mode, image, index))
+    
+    def stats(self) -> tuple:
+        """Returns the hits, the misses, the number of surfaces 
+        in the cache and their size in bytes"""
+        return self.hits, self.misses, len(self.surfaces), self.bytes
+
+def laser_segment(screen:pygame.surface.Surface, origin:tuple,
+                  angle:float) -> tuple:
+    """Returns the coordinates of the two points of the laser 
+    segment, which starts at 'origin' and is as long as the 
+    screen width
+
+    Args:
+        screen: The main surface
+        origin: Coordinates of the laser origin
+        angle: Angle of rotation of the turret
+
+    Returns:
+        tuple: The coordinates of the laser segment
+    """
+    origin = pygame.math.Vector2(origin)
+    length = pygame.math.Vector2(0,-screen.get_width()).rotate(-angle)
+    
+    return origin, origin+length
 
 def laser(screen:pygame.surface.Surface, origin:tuple,
           angle:float) -> tuple:
@@ -259,22 +596,50 @@ def laser(screen:pygame.surface.Surface, origin:tuple,
     Returns:
         tuple: The coordinates of the laser segment
     """    
-    screen_width = screen.get_width()
     color=(255,0,0)
     thickness = 3
-    length = pygame.math.Vector2(0,-screen_width).rotate(-angle)
-    pygame.draw.line(screen, color, origin, origin+length, thickness)
+    start, end = laser_segment(screen, origin, angle)
+    pygame.draw.line(screen, color, start, end, thickness)
     
-    return origin, origin+length
+    return start, end
+
+def line_rects(start:tuple, end:tuple, thickness:int = 1,
+               chunk:int = 32) -> list:
+    """Covers a line with small rects, one per 'chunk' pixels of
+    length. The bounding rect of a long diagonal line, such as the
+    laser, would be almost the whole screen
+
+    Args:
+        start: First point of the line
+        end: Last point of the line
+        thickness: Thickness of the drawn line
+        chunk: Length of line covered by each rect
+
+    Returns:
+        list: Rects containing all the pixels of the line
+    """
+    start = pygame.math.Vector2(start)
+    end = pygame.math.Vector2(end)
+    pieces = int(start.distance_to(end) // chunk) + 1
+    margin = 2 * thickness + 2
+    
+    rects = []
+    for i in range(pieces):
+        a = start.lerp(end, i / pieces)
+        b = start.lerp(end, (i + 1) / pieces)
+        rect = pygame.Rect(min(a.x, b.x), min(a.y, b.y),
+                           abs(b.x - a.x) + 1, abs(b.y - a.y) + 1)
+        rects.append(rect.inflate(margin, margin))
+    return rects
 
 def background() -> pygame.surface.Surface: 
-    """Load background image
+    """Load background image, stretched to the render resolution
 
     Returns:
         pygame.surface.Surface: Background Surface
     """     
-    background_img = pygame.image.load("assets/images/background_2.png")
-    background_img = background_img.convert()
+    background_img = assets.image("assets/images/background_2.png", 
+                                  resolution.stretch, alpha=False)
     
     return background_img
 
@@ -295,27 +660,169 @@ def seconds_to_hms(seconds:float) -> str:
 
     return formatted_time
 
-def debug_mode(screen:pygame.surface.Surface, refs:dict,
+class DebugOverlay():
+    """Renders the texts of the debug mode.
+    
+    The font is created once and each rendered text is kept in 
+    a cache indexed by its string (bounded, least recently used 
+    texts are evicted). The lines of the information panel are 
+    composed into a single surface which is only updated for the 
+    lines whose text changed since the previous frame, the panel 
+    is then blitted in one go.
+    """
+    def __init__(self, font_size:int = 20, line_height:int = 20,
+                 color:tuple = (255,255,255), max_texts:int = 512):
+        self.font_size = font_size
+        self.line_height = line_height
+        self.color = color
+        self.max_texts = max_texts
+        self.font = None # Created on first use, after pygame.init()
+        self.texts = OrderedDict()
+        
+        self.lines = [] # Texts currently composed in the panel
+        self.panel = None
+    
+    def text(self, string:str) -> pygame.surface.Surface:
+        """Returns the rendered surface of a text
+
+        Args:
+            string : Text to render
+        """
+        surface = self.texts.get(string)
+        if surface is not None:
+            self.texts.move_to_end(string)
+            return surface
+        
+        if self.font is None:
+            self.font = pygame.font.Font(None, self.font_size)
+        
+        surface = self.font.render(string, True, self.color)
+        self.texts[string] = surface
+        if len(self.texts) > self.max_texts:
+            self.texts.popitem(last=False)
+        
+        return surface
+    
+    def compose(self, lines:list) -> pygame.surface.Surface:
+        """Updates the panel with the given lines and returns it. 
+        Only the lines which changed are rendered and redrawn, the 
+        panel is rebuilt if it becomes too small
+
+        Args:
+            lines : Texts of the panel, one per line
+        """
+        surfaces = [self.text(line) for line in lines]
+        width = max(surface.get_width() for surface in surfaces)
+        height = len(lines) * self.line_height
+        
+        if (self.panel is None or width > self.panel.get_width() or
+            height != self.panel.get_height()):
+            # Some margin avoids rebuilding the panel when the 
+            # length of a line varies slightly
+            self.panel = pygame.Surface((width + 40, height), pygame.SRCALPHA)
+            self.lines = [None] * len(lines)
+        
+        for i, (line, surface) in enumerate(zip(lines, surfaces)):
+            if line != self.lines[i]:
+                row = pygame.Rect(0, i * self.line_height, 
+                                  self.panel.get_width(), self.line_height)
+                self.panel.fill((0, 0, 0, 0), row)
+                self.panel.blit(surface, row)
+                self.lines[i] = line
+        
+        return self.panel
+
+overlay = DebugOverlay()
+
+def frame_time_bar(screen:pygame.surface.Surface, profilerObject,
+                   overlayObject:DebugOverlay, topleft:tuple,
+                   width:int = 300, height:int = 14,
+                   budget:float = 1000/60) -> list:
+    """Draws the mean time of each stage of the frame as a stacked 
+    bar, followed by a legend giving the mean, p95 and max values 
+    of the stages (in ms) over the frames kept by the profiler
+
+    Args:
+        screen: The main Pygame surface
+        profilerObject: FrameProfiler object
+        overlayObject: DebugOverlay object rendering the legend
+        topleft: Position of the bar
+        width: Width of the bar for the frame budget
+        height: Height of the bar
+        budget: Frame budget in ms (a 60 fps frame by default)
+
+    Returns:
+        list: Rects of the drawn elements
+    """
+    stats = profilerObject.rolling_stats()
+    if not stats:
+        return []
+    
+    rects = []
+    
+    palette = [(230, 25, 75), (60, 180, 75), (255, 225, 25), 
+               (0, 130, 200), (245, 130, 48), (145, 30, 180), 
+               (70, 240, 240), (240, 50, 230), (210, 245, 60), 
+               (250, 190, 212), (0, 128, 128), (170, 110, 40)]
+    white = (255,255,255)
+    
+    # The bar is scaled on the budget, or on the frame if longer
+    scale = width / max(budget, stats["frame"]["mean"])
+    pos_x, pos_y = topleft
+    
+    for i, name in enumerate(profilerObject.stages):
+        length = stats[name]["mean"] * scale
+        color = palette[i % len(palette)]
+        rects.append(pygame.draw.rect(screen, color, 
+                                      (pos_x, pos_y, length, height)))
+        pos_x += length
+    
+    # Frame budget marker and frame outline
+    budget_x = topleft[0] + budget * scale
+    rects.append(pygame.draw.line(screen, white, (budget_x, topleft[1] - 3), 
+                                  (budget_x, topleft[1] + height + 3), 2))
+    rects.append(pygame.draw.rect(screen, white, (topleft[0], topleft[1], 
+                                  stats["frame"]["mean"] * scale, height), 1))
+    
+    # Legend
+    pos_y = topleft[1] + height + 8
+    names = profilerObject.stages + ["frame"]
+    for i, name in enumerate(names):
+        values = stats[name]
+        text = (f"{name} : {values['mean']:.2f} / {values['p95']:.2f} / "
+                f"{values['max']:.2f} ms")
+        color = palette[i % len(palette)] if name != "frame" else white
+        rects.append(pygame.draw.rect(screen, color, (topleft[0], pos_y + 3, 8, 8)))
+        rects.append(screen.blit(overlayObject.text(text), (topleft[0] + 14, pos_y)))
+        pos_y += 16
+    
+    return rects
+
+def debug_mode(screen:pygame.surface.Surface, refs:list,
                turret_base:pygame.rect.Rect, 
-               rotationObject, mobsObject, 
+               turretsObject, mobsObject, 
                soundsObject:SoundManager,
                thunderObject, rainObject, 
-               clock:pygame.time.Clock) -> None:
+               clock:pygame.time.Clock,
+               spriteCacheObject:RotatedSpriteCache = None,
+               profilerObject = None,
+               overlayObject:DebugOverlay = overlay) -> list:
     """Shows on-screen information about animation states.
     Like highlighting reference points
 
     Args:
         screen: The main Pygame surface
         
-        refs: Dictionary containing the coordinates of 
-        all reference points
+        refs: Dictionaries containing the coordinates of 
+        all reference points, one per turret
         
         turret_base : Allows you to visualize the perimeter 
-        of the turret base as well as its proximity, an area 
+        of the turret bases as well as their proximity, an area 
         in which mobs cannot appear
         
-        rotationObject : Collects information related to the 
-        angular state of the turret
+        turretsObject : TurretBank object, collects information 
+        related to the angular state of the turrets (the first 
+        one for the texts)
         
         mobsObject : Collects information related to the quantity 
         of mobs present on the screen
@@ -323,13 +830,24 @@ def debug_mode(screen:pygame.surface.Surface, refs:dict,
         cannon_detect :
         
         clock : Allows you to retrieve the effective fps value
+        
+        spriteCacheObject : Collects the hits and misses of the 
+        rotated turret sprites cache
+        
+        profilerObject : FrameProfiler whose stage timings are 
+        displayed as a stacked frame time bar
+        
+        overlayObject : DebugOverlay rendering and caching the texts
+    
+    Returns:
+        list: Rects of the drawn elements
     """
     global start_time
     
     WIDTH = screen.get_width()
     HEIGHT = screen.get_height()
     
-    channels_busy = soundsObject.total_in_playing()
+    voices_busy = soundsObject.total_in_playing()
     duration_str = seconds_to_hms(time.time() - start_time)
     
     # Colors
@@ -338,58 +856,72 @@ def debug_mode(screen:pygame.surface.Surface, refs:dict,
     green = (0, 255, 0)
     orange = (255, 165, 0)
     
-    # Load texts
-    font = pygame.font.Font(None, 20)
-    
+    # Texts
     duration = f"Duration : {duration_str}" 
     win_size = f"Window size : {WIDTH}x{HEIGHT}"
     fps = f"FPS : {round(clock.get_fps(), 2)}"
-    turret_size = f"Turret size = {int(refs["small_side"])}x{int(refs["long_side"])}"
-    angle_text = f"Turret angle : {rotationObject.get_angle()}"
-    turret_speed = f"Turret speed : {rotationObject.current_speed}"
-    turret_mode = f"Turret mode : {rotationObject.mode}"
+    small_side, long_side = int(refs[0]['small_side']), int(refs[0]['long_side'])
+    turret_size = f"Turret size = {small_side}x{long_side}"
+    turrets = f"Turrets : {len(turretsObject)}"
+    angle_text = f"Turret angle : {turretsObject.get_angle(0)}"
+    turret_speed = f"Turret speed : {turretsObject.current_speeds[0]}"
+    turret_mode = f"Turret mode : {turretsObject.get_mode(0)}"
     max_mob = f"Maximum mobs : {mobsObject.max_living_mobs}"
-    living_mobs = f"Living mobs : {len(mobsObject.living_mobs)}"
-    detected_mob = f"Detected mob : {mobsObject.in_target}"
-    sounds_playing = f"Sounds playing : {channels_busy[0]}/{channels_busy[1]}"
+    living_mobs = f"Living mobs : {len(mobsObject)}"
+    detected_mob = f"Detected mob : {turretsObject.get_target(0)}"
+    hit_angle = turretsObject.get_hit_angle(0)
+    hit_text = f"Hit angle : {'None' if hit_angle is None else round(hit_angle, 2)}"
+    sounds_playing = f"Sounds playing : {voices_busy[0]}/{voices_busy[1]}"
     strong_wind = f"Strong wind : {rainObject.strong_wind_displayed}"
     lightning = f"Lightning : {thunderObject.lightning_displayed}"
     
-    all_text = [duration, win_size, fps, turret_size, angle_text, 
+    all_text = [duration, win_size, fps, turret_size, turrets, angle_text, 
                 turret_speed, turret_mode, max_mob, living_mobs, 
-                detected_mob, sounds_playing, strong_wind, lightning]
+                detected_mob, hit_text, sounds_playing, strong_wind, lightning]
     
-    # Displays texts
+    if spriteCacheObject is not None:
+        hits, misses, size, size_bytes = spriteCacheObject.stats()
+        all_text.append(f"Sprite cache : {hits} hits / {misses} misses "
+                        f"({size}, {size_bytes / 2**20:.0f} MiB)")
+    
+    # Displays texts, only the lines which changed are rendered
     pos_x = 20
     pos_y = 20
-    offset = 20 # y axis offset
-    
-    for text in all_text:
-        text_surface = font.render(text, True, white)
-        text_rect = text_surface.get_rect(topleft=(pos_x, pos_y))
-        screen.blit(text_surface, text_rect)
-        pos_y += offset
-    
-    # Displays turret base rect and its proximity, areas in which 
-    # mobs cannot appear
+    rects = [screen.blit(overlayObject.compose(all_text), (pos_x, pos_y))]
     
-    proximity = mobsObject.turret_base_proximity
-    turret_base_inflated = turret_base.inflate(proximity, proximity) 
+    # Displays the time spent in each stage of the frame
+    if profilerObject is not None:
+        bar_y = HEIGHT - 20 - 16 * (len(profilerObject.stages) + 1) - 22
+        rects += frame_time_bar(screen, profilerObject, overlayObject, 
+                                (pos_x, bar_y))
     
-    turret_base_inflated.center = (WIDTH//2, HEIGHT//2)
-    turret_base.center = (WIDTH//2, HEIGHT//2)
+    # Displays turret base rects and their proximity, areas in 
+    # which mobs cannot appear
+    proximity = resolution.length(mobsObject.turret_base_proximity)
+    vertices = ["top_left", "top_right", "bottom_right", "bottom_left"]
     
-    pygame.draw.rect(screen, green, turret_base, 2)
-    pygame.draw.rect(screen, orange, turret_base_inflated, 2)
+    for center, turret_refs in zip(turretsObject.centers.tolist(), refs):
+        turret_base_inflated = turret_base.inflate(proximity, proximity) 
+        
+        turret_base_inflated.center = center
+        turret_base.center = center
+        
+        rects.append(pygame.draw.rect(screen, green, turret_base, 2))
+        rects.append(pygame.draw.rect(screen, orange, turret_base_inflated, 2))
+        
+        # Displays referential points
+        for key, pos in turret_refs.items():
+            if not isinstance(pos, float):
+                if key in vertices:
+                    rects.append(pygame.draw.circle(screen, white, 
+                                                    (pos[0], pos[1]), 4))
+                else: 
+                    rects.append(pygame.draw.circle(screen, red, 
+                                                    (pos[0], pos[1]), 4))
+        
+        # Displays cannon target line
+        pygame.draw.line(screen, white, turret_refs["cannon"], 
+                         turret_refs["target"], 2)
+        rects += line_rects(turret_refs["cannon"], turret_refs["target"], 2)
     
-    # Displays referential points
-    vertices = ["top_left", "top_right", "bottom_right", "bottom_left"]
-    for key, pos in refs.items():
-        if not isinstance(pos, float):
-            if key in vertices:
-                pygame.draw.circle(screen, white, (pos[0], pos[1]), 4)
-            else: 
-                pygame.draw.circle(screen, red, (pos[0], pos[1]), 4)
-    
-    # Displays cannon target line
-    pygame.draw.line(screen, white, refs["cannon"], refs["target"], 2)
\ No newline at end of file
+    return rects
\ No newline at end of file
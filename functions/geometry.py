@@ -91,7 +91,7 @@ def matrix_rotation(rect: pygame.rect.Rect,
     return rotated_points
 
 def ref_points(screen:pygame.surface.Surface, rect: pygame.rect.Rect, 
-               angle:float) -> dict:
+               angle:float, scale:float = 1.0) -> dict:
     """Sets turret reference points at each rotation angle.
     
     These points are used to precisely place different elements 
@@ -102,6 +102,8 @@ def ref_points(screen:pygame.surface.Surface, rect: pygame.rect.Rect,
     Args:
         rect: A Rect object
         angle: Angle in degrees
+        scale: Factor applied to the offsets in pixels, which are 
+        chosen for the reference resolution (see resolution.py)
 
     Returns:
         dict: A dictionary containing the coordinates 
@@ -132,15 +134,16 @@ def ref_points(screen:pygame.surface.Surface, rect: pygame.rect.Rect,
     cannon_target = cannon_point+pygame.math.Vector2(0,-WIDTH).rotate(-angle)
     
     # Laser referentials
-    top_laser = midpoint(top_left, top_right, offset=-48)
-    bottom_laser = midpoint(bottom_left, bottom_right, offset=-48)
-    laser_start = midpoint(top_laser, bottom_laser, offset=20)
+    top_laser = midpoint(top_left, top_right, offset=-48*scale)
+    bottom_laser = midpoint(bottom_left, bottom_right, offset=-48*scale)
+    laser_start = midpoint(top_laser, bottom_laser, offset=20*scale)
     
     # Steam referentials
-    steam_right_alignment = midpoint(top_right, bottom_right, offset=10)
-    steam_left_alignment = midpoint(top_left, bottom_left, offset=10)
-    steam_origin = midpoint(steam_left_alignment, steam_right_alignment, offset=40)
-    steam_end = steam_origin+pygame.math.Vector2(250,0).rotate(-angle)
+    steam_right_alignment = midpoint(top_right, bottom_right, offset=10*scale)
+    steam_left_alignment = midpoint(top_left, bottom_left, offset=10*scale)
+    steam_origin = midpoint(steam_left_alignment, steam_right_alignment, 
+                            offset=40*scale)
+    steam_end = steam_origin+pygame.math.Vector2(250*scale,0).rotate(-angle)
     
     refs = {
         # Turret rect referentials
@@ -172,41 +175,287 @@ def ref_points(screen:pygame.surface.Surface, rect: pygame.rect.Rect,
     
     return refs
     
-def detection(origin:tuple, end:tuple, mob_sprites:list,
-              tolerance:float=0.2) -> pygame.math.Vector2:
-    """Detects when a mob's coordinates intersect the laser segment.
+def sweep_hits(centers:np.ndarray, start_angles:np.ndarray, 
+               end_angles:np.ndarray, lateral:np.ndarray, 
+               near:np.ndarray, far:np.ndarray, positions:np.ndarray, 
+               radius:float = 4.0, mask:np.ndarray = None) -> tuple:
+    """Detects the mobs crossed by rotating rays during a whole 
+    simulation step, not only at its final angle.
     
-    A-------------M-----B
-    If points AB represent the coordinates of the laser segment 
-    and point M the coordinates of the mob, we can determine 
-    that M is on the segment if the distance AM + MB = AB.
-    The function goes through the coordinates of the mobs in 
-    mob_sprites, checking for each of them if this equality is 
-    respected. If this is the case the function returns 
-    the coordinates of the detected mob else it returns None.
+    Each ray turns around the center of its turret. At angle 0 it 
+    points upwards, 'lateral' pixels to the right of the center, 
+    from 'near' to 'far' pixels along its direction. A ray 
+    turned by an angle theta passes through a mob at distance r 
+    of the center and at polar angle phi when 
+    r * sin(theta - phi) = lateral, i.e. at the exact angle 
+    theta = phi + asin(lateral / r). The mob (a disc of 'radius' 
+    pixels) is hit if this angle, widened by the angular size of 
+    the disc, lies in the sector swept between the start and end 
+    angles of the step. A fast rotation or a long step can then 
+    no longer jump over a mob.
+    
+    All the rays are tested against all the given mobs at once, 
+    sweep_cells() narrows them down to the mobs of the grid cells 
+    the rays may cross.
+
+    Args:
+        centers: Array of shape (n, 2) of the turrets centers
+        start_angles: Array of shape (n,) of the angles at the 
+        start of the step, in degrees
+        end_angles: Angles at the end of the step (greater or 
+        equal, the turrets only turn in one direction)
+        lateral: Array of shape (n,) of the lateral offsets
+        near: Array of shape (n,) of the start distances of the rays
+        far: Array of shape (n,) of the end distances of the rays
+        positions: Array of shape (m, 2) of the mobs coordinates
+        radius: Radius of the mobs in pixels
+        mask: Boolean array of shape (n, m) of the mobs each ray 
+        can hit, all of them if None
+
+    Returns:
+        tuple: For each ray, the index of the first mob crossed 
+        by the sweep in 'positions' (-1 if there is none) and the 
+        exact angle at which the ray passes through its center 
+        (NaN if there is none), expressed from the start angle
+    """
+    count = len(centers)
+    if len(positions) == 0:
+        return np.full(count, -1), np.full(count, np.nan)
+    
+    start = np.asarray(start_angles, dtype=float)[:, None]
+    sweep = np.asarray(end_angles, dtype=float)[:, None] - start
+    lateral = np.asarray(lateral, dtype=float)[:, None]
+    
+    # Polar coordinates of the mobs around each turret, shape 
+    # (rays, mobs). The angles follow the turret convention : 0 
+    # upwards, increasing counterclockwise on the screen
+    dx = positions[None, :, 0] - centers[:, None, 0]
+    dy = positions[None, :, 1] - centers[:, None, 1]
+    r = np.hypot(dx, dy)
+    phi = np.degrees(np.arctan2(-dx, -dy))
+    
+    # Exact angle of the ray passing through each mob and 
+    # distance of the mob along the ray at that angle
+    reachable = r >= np.abs(lateral)
+    ratio = np.clip(lateral / np.maximum(r, 1e-9), -1.0, 1.0)
+    exact = phi + np.degrees(np.arcsin(ratio))
+    along = np.sqrt(np.maximum(r**2 - lateral**2, 0.0))
+    
+    # Half of the angle under which the mob disc is seen
+    width = np.degrees(np.arcsin(radius / np.maximum(along, radius)))
+    
+    # Angle travelled from the start of the widened interval of 
+    # each mob to reach it, the mob is in the swept sector if it 
+    # is reached before the end of the step
+    offset = (exact - start + width) % 360
+    hits = (reachable & (offset <= sweep + 2 * width) & 
+            (along >= np.asarray(near)[:, None] - radius) & 
+            (along <= np.asarray(far)[:, None] + radius))
+    if mask is not None:
+        hits &= mask
+    
+    # The first mob met by each ray, the nearest one if several 
+    # are aligned
+    score = np.where(hits, offset + along * 1e-7, np.inf)
+    first = np.argmin(score, axis=1)
+    found = hits.any(axis=1)
+    
+    rows = np.arange(count)
+    angles = start[:, 0] + offset[rows, first] - width[rows, first]
+    
+    return (np.where(found, first, -1), 
+            np.where(found, angles, np.nan))
+
+def sweep_cells(centers:np.ndarray, start_angles:np.ndarray,
+                end_angles:np.ndarray, lateral:np.ndarray,
+                near:np.ndarray, far:np.ndarray, radius:float,
+                cell_size:int) -> list:
+    """Lists the grid cells that the rays of sweep_hits() may
+    cross during a step.
+
+    The sector swept by each ray is sampled on a polar lattice,
+    along the ray and from the start angle to the end angle, with
+    points less than half a cell apart. Every point of the sector,
+    widened by the radius of the mobs, is then less than a cell
+    away from a sample: its cell is one of the 3x3 cells around
+    the cell of the sample. The number of cells only depends on
+    the area swept, not on the number of mobs.
 
     Args:
-        origin: Coordinates of the laser segment's origin point
-        end: Laser segment end point coordinates
-        mob_sprites: Mobs list
-        tolerance: Tolerance value for mob detection
+        centers: Array of shape (n, 2) of the turrets centers
+        start_angles: Array of shape (n,) of the angles at the
+        start of the step, in degrees
+        end_angles: Angles at the end of the step
+        lateral: Array of shape (n,) of the lateral offsets
+        near: Array of shape (n,) of the start distances of the rays
+        far: Array of shape (n,) of the end distances of the rays
+        radius: Radius of the mobs in pixels
+        cell_size: Size of the grid cells in pixels
+
     Returns:
-        tuple: Coordinates of the detected mob
+        list: (column, row) of the swept cells
     """
-    val_round = 1    
-    for mob in mob_sprites:        
-        pos = mob['pos'] # pygame.math.Vector2
-        dist1 = round(get_distance(origin, pos), val_round)
-        dist2 = round(get_distance(pos, end), val_round)
-        dist3 = round(get_distance(origin, end), val_round)
+    step = cell_size / 2
+    start = np.radians(np.asarray(start_angles, dtype=float))
+    sweep = np.minimum(np.radians(np.asarray(end_angles, dtype=float)) - start,
+                       2 * np.pi)
+    lateral = np.asarray(lateral, dtype=float)
+    near = np.asarray(near, dtype=float) - radius
+    far = np.asarray(far, dtype=float) + radius
+
+    # Distances along the rays and angles of the samples, shape
+    # (rays, distances, angles). The rays have as many samples as
+    # the longest ray or the widest sweep, the extra ones are
+    # clipped to the ends and only repeat cells
+    lengths = np.ceil((far - near) / step).astype(int)
+    arcs = np.ceil(sweep * (far + np.abs(lateral)) / step).astype(int)
+    along = np.minimum(near[:, None] + step * np.arange(lengths.max() + 1), 
+                       far[:, None])[:, :, None]
+    angles = (start[:, None] + np.minimum(
+        sweep[:, None] / np.maximum(arcs, 1)[:, None] * np.arange(arcs.max() + 1),
+        sweep[:, None]))[:, None, :]
+
+    # Turret convention : the ray points upwards at angle 0 and
+    # turns counterclockwise on the screen
+    sin, cos = np.sin(angles), np.cos(angles)
+    lateral = lateral[:, None, None]
+    x = centers[:, 0, None, None] + lateral * cos - along * sin
+    y = centers[:, 1, None, None] - lateral * sin - along * cos
+
+    # The cells are numbered column * span + row, the neighbors of 
+    # the cells of the samples are added by shifting the numbers
+    span = 1 << 20
+    columns = np.floor(x.ravel() / cell_size).astype(np.int64)
+    rows = np.floor(y.ravel() / cell_size).astype(np.int64)
+    cells = np.unique(columns * span + rows)
+    shifts = np.array([dx * span + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+    cells = np.unique((cells[:, None] + shifts).ravel())
+
+    # Rows are kept within +-span/2 so that the division 
+    # recovers them
+    columns, rows = np.divmod(cells + span // 2, span)
+    return list(zip(columns.tolist(), (rows - span // 2).tolist()))
+
+class RefPointTable():
+    """Precomputed version of ref_points().
+    
+    The shape of the turret never changes, so every reference 
+    point is a fixed offset from the center of the turret rect, 
+    rotated by the turret angle. The offsets are computed once 
+    with ref_points() at angle 0, then rotated for every angle 
+    of a 360° turn with a step of 'resolution' degrees and stored 
+    in a single array of shape (number of angles, number of 
+    points, 2). A lookup is then only an index computation.
+    Since the table only stores offsets, it can be shared by 
+    several turrets of the same size placed at different centers.
+    'scale' is the factor of the render resolution, passed to 
+    ref_points().
+    """
+    def __init__(self, screen:pygame.surface.Surface, 
+                 rect:pygame.rect.Rect, resolution:float = 0.1,
+                 scale:float = 1.0):
+        self.steps = int(round(360 / resolution))
+        self.resolution = 360 / self.steps
+        self.center = np.array(rect.center, dtype=float)
+        
+        # Reference points at angle 0, the sizes (floats) don't 
+        # depend on the angle and are kept aside
+        refs = ref_points(screen, rect, 0, scale)
+        self.sizes = {key: val for key, val in refs.items() 
+                      if isinstance(val, float)}
+        self.keys = [key for key in refs if key not in self.sizes]
+        self.columns = {key: i for i, key in enumerate(self.keys)}
+        self.vertices = {"top_left", "top_right", 
+                         "bottom_right", "bottom_left"}
+        
+        offsets = np.array([tuple(refs[key]) for key in self.keys]) - self.center
+        
+        # Same rotation as the one applied by matrix_rotation() to 
+        # the rect vertices, for all the angles at once
+        angles = np.radians(np.arange(self.steps) * self.resolution)
+        cos = np.cos(angles)[:, None]
+        sin = np.sin(angles)[:, None]
+        
+        self.table = np.empty((self.steps, len(self.keys), 2))
+        self.table[:, :, 0] = cos * offsets[:, 0] + sin * offsets[:, 1]
+        self.table[:, :, 1] = -sin * offsets[:, 0] + cos * offsets[:, 1]
+    
+    def points(self, angle:float, interpolate:bool = False, 
+               center:tuple = None) -> np.ndarray:
+        """Returns the coordinates of all the reference points 
+        (in the order of self.keys) for a given angle
+
+        Args:
+            angle: Angle in degrees
+            interpolate: If True, the points are linearly 
+            interpolated between the two closest angles of the 
+            table, else the closest angle is used
+            center: Center of the turret, defaults to the center 
+            of the rect used to build the table
+
+        Returns:
+            np.ndarray: Array of shape (number of points, 2)
+        """
+        if center is None:
+            center = self.center
+        
+        position = (angle % 360) / self.resolution
+        if not interpolate:
+            return self.table[int(round(position)) % self.steps] + center
+        
+        index = int(position)
+        fraction = position - index
+        current = self.table[index % self.steps]
+        following = self.table[(index + 1) % self.steps]
         
-        # The sum of the distances dist1 and dist2 can result 
-        # in floating values which, depending on the rotation 
-        # speed or fps, may never precisely reach equality with 
-        # dist 3 (value jump). To remedy this we round the 
-        # distance values to 1 decimal place and add a tolerance 
-        # value so that a mob is detected even if the laser 
-        # is not precisely in its center.
-        diff = dist1 + dist2 - dist3
-        if abs(diff) <= tolerance:
-            return pos
\ No newline at end of file
+        return current + fraction * (following - current) + center
+    
+    def points_batch(self, angles:np.ndarray, 
+                     centers:np.ndarray) -> np.ndarray:
+        """Returns the reference points of several turrets at once, 
+        each one with its own angle and center (closest angle of 
+        the table, as points())
+
+        Args:
+            angles: Array of shape (n,) of angles in degrees
+            centers: Array of shape (n, 2) of the turrets centers
+
+        Returns:
+            np.ndarray: Array of shape (n, number of points, 2)
+        """
+        positions = (np.asarray(angles, dtype=float) % 360) / self.resolution
+        rows = np.rint(positions).astype(int) % self.steps
+        
+        return self.table[rows] + np.asarray(centers, dtype=float)[:, None, :]
+    
+    def as_dict(self, points:np.ndarray) -> dict:
+        """Converts the points of one turret (in the order of 
+        self.keys) into a dictionary like the one of ref_points()
+
+        Args:
+            points: Array of shape (number of points, 2)
+        """
+        refs = {}
+        for key, (x, y) in zip(self.keys, points.tolist()):
+            if key in self.vertices:
+                refs[key] = (x, y)
+            else:
+                refs[key] = pygame.math.Vector2(x, y)
+        refs.update(self.sizes)
+        
+        return refs
+    
+    def lookup(self, angle:float, interpolate:bool = False, 
+               center:tuple = None) -> dict:
+        """Drop-in replacement for ref_points()
+
+        Args:
+            angle: Angle in degrees
+            interpolate: Interpolation between the table angles
+            center: Center of the turret
+
+        Returns:
+            dict: A dictionary containing the coordinates 
+            of all reference points
+        """
+        return self.as_dict(self.points(angle, interpolate, center))
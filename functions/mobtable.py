@@ -0,0 +1,131 @@
+"""
+mobtable.py - Mob table module
+
+This module stores the mobs of the scene as a structure of arrays:
+one NumPy column per attribute (position, rect, sprite, state...),
+the mobs occupying the first rows without gaps. Detection and
+display can go through these columns at once instead of a list of
+dictionaries.
+"""
+from functions.geometry import np
+
+ALIVE = 0
+DESTROYED = 1
+
+class MobTable():
+    """Table of the living mobs, one row per mob.
+
+    Each mob receives a unique integer id which never changes,
+    while its row may: a mob is deleted by moving the last row
+    in its place (swap-remove), so the rows stay contiguous and
+    a deletion never shifts the other mobs. self.index gives the
+    current row of each id.
+
+    Columns (only the first self.count rows are valid) :
+        ids : Id of the mob
+        pos : Coordinates of the center (x, y)
+        rect : Rect of the displayed sprite (x, y, width, height)
+        sprite : Index of the sprite in the list chosen by the state
+        state : ALIVE or DESTROYED
+        dist : Distance to the cannon when the mob appeared
+    """
+    def __init__(self, capacity:int = 16):
+        self.capacity = capacity
+        self.count = 0
+        self.next_id = 0
+        self.index = {} # Mob id : row
+
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.pos = np.zeros((capacity, 2), dtype=float)
+        self.rect = np.zeros((capacity, 4), dtype=np.int32)
+        self.sprite = np.zeros(capacity, dtype=np.int32)
+        self.state = np.zeros(capacity, dtype=np.int8)
+        self.dist = np.zeros(capacity, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, mob_id) -> bool:
+        return mob_id in self.index
+
+    def columns(self) -> list:
+        """Names of the columns of the table"""
+        return ["ids", "pos", "rect", "sprite", "state", "dist"]
+
+    def grow(self) -> None:
+        """Doubles the capacity of all the columns"""
+        self.capacity *= 2
+        for name in self.columns():
+            column = getattr(self, name)
+            grown = np.zeros((self.capacity,) + column.shape[1:],
+                             dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            setattr(self, name, grown)
+
+    def add(self, pos:tuple, rect:tuple, sprite:int, dist:int = 0) -> int:
+        """Adds a living mob at the end of the table
+
+        Args:
+            pos: Coordinates of the center of the mob
+            rect: Rect of its sprite (x, y, width, height)
+            sprite: Index of its sprite
+            dist: Distance to the cannon
+
+        Returns:
+            int: Id of the new mob
+        """
+        if self.count == self.capacity:
+            self.grow()
+
+        row = self.count
+        mob_id = self.next_id
+        self.next_id += 1
+
+        self.ids[row] = mob_id
+        self.pos[row] = pos
+        self.rect[row] = tuple(rect)
+        self.sprite[row] = sprite
+        self.state[row] = ALIVE
+        self.dist[row] = dist
+
+        self.index[mob_id] = row
+        self.count += 1
+        return mob_id
+
+    def remove(self, mob_id:int) -> None:
+        """Deletes a mob by moving the last row in its place
+
+        Args:
+            mob_id: Id of the mob
+        """
+        row = self.index.pop(mob_id)
+        last = self.count - 1
+
+        if row != last:
+            for name in self.columns():
+                column = getattr(self, name)
+                column[row] = column[last]
+            self.index[int(self.ids[row])] = row
+
+        self.count -= 1
+
+    def row(self, mob_id:int) -> int:
+        """Returns the current row of a mob, None if it doesn't exist"""
+        return self.index.get(mob_id)
+
+    def rows(self, mob_ids:np.ndarray) -> np.ndarray:
+        """Returns the current rows of several mobs, -1 for those
+        which don't exist"""
+        return np.fromiter((self.index.get(mob_id, -1) 
+                            for mob_id in mob_ids.tolist()),
+                           dtype=np.intp, count=len(mob_ids))
+
+    @property
+    def positions(self) -> np.ndarray:
+        """Coordinates of all the mobs, array of shape (n, 2)"""
+        return self.pos[:self.count]
+
+    def clear(self) -> None:
+        """Deletes all the mobs, the ids keep increasing"""
+        self.count = 0
+        self.index.clear()
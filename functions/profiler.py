@@ -0,0 +1,199 @@
+"""
+profiler.py - Profiling module
+
+This module provides the timers used to measure the time spent
+in each stage of the main loop (detection, rain, display...).
+"""
+import json
+import time
+import numpy as np
+
+class TimingScope():
+    """Context manager adding the time spent in its block to one
+    stage of a FrameTimer. A scope is created once per stage name
+    and reused at each frame"""
+    def __init__(self, timer, name:str):
+        self.timer = timer
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        current = self.timer.current
+        current[self.name] = current.get(self.name, 0.0) + elapsed
+        return False
+
+class FrameTimer():
+    """Records the time spent in named stages, frame by frame.
+
+    A stage can be entered several times during a frame (for
+    example once in the simulation update and once in the
+    display), its durations are then added up. Each call to
+    end_frame() stores the totals of the frame.
+    """
+    def __init__(self):
+        self.scopes = {}
+        self.current = {} # Stage name : seconds, for this frame
+        self.frames = [] # One dict per finished frame
+        self.frame_start = None
+
+    def scope(self, name:str) -> TimingScope:
+        """Returns the timing scope of a stage
+
+        Args:
+            name: Name of the stage
+        """
+        scope = self.scopes.get(name)
+        if scope is None:
+            scope = self.scopes[name] = TimingScope(self, name)
+        return scope
+
+    def begin_frame(self) -> None:
+        self.current = {}
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self) -> dict:
+        """Stores the durations of the frame and returns them,
+        the whole frame duration is stored under 'frame'"""
+        self.current["frame"] = time.perf_counter() - self.frame_start
+        self.frames.append(self.current)
+        return self.current
+
+    def stage_names(self) -> list:
+        """Names of the recorded stages, in order of appearance"""
+        names = []
+        for frame in self.frames:
+            for name in frame:
+                if name not in names:
+                    names.append(name)
+        return names
+
+    def durations(self, name:str) -> np.ndarray:
+        """Durations of a stage for all the recorded frames (0.0
+        for the frames in which the stage wasn't entered)
+
+        Args:
+            name: Name of the stage
+        """
+        return np.array([frame.get(name, 0.0) for frame in self.frames])
+
+    def summary(self, percentiles:tuple = (50, 95, 99)) -> dict:
+        """Statistics of each stage in milliseconds
+
+        Args:
+            percentiles: Percentiles to compute
+
+        Returns:
+            dict: Stage name : {'mean', 'p50', ..., 'max'}
+        """
+        stats = {}
+        for name in self.stage_names():
+            values = self.durations(name) * 1000
+            stats[name] = {"mean" : float(values.mean())}
+            for q in percentiles:
+                stats[name][f"p{q}"] = float(np.percentile(values, q))
+            stats[name]["max"] = float(values.max())
+        return stats
+
+class FrameProfiler(FrameTimer):
+    """FrameTimer keeping only the last 'capacity' frames in a
+    ring buffer, so that it can stay active during a whole session.
+
+    The durations are stored in a NumPy array with one column per
+    stage (plus the whole frame). Rolling statistics (mean, p95,
+    max) are computed on the frames of the buffer and the profile
+    can be saved as JSON or CSV, for example on exit.
+    """
+    stages = ["events", "background", "mobs", "rotate", "ref_points",
+              "laser", "detection", "rain", "overlay", "flip"]
+
+    def __init__(self, capacity:int = 240, stages:list = None):
+        super().__init__()
+        if stages is not None:
+            self.stages = list(stages)
+        else:
+            self.stages = list(FrameProfiler.stages)
+        self.capacity = capacity
+        self.columns = {name : i for i, name in enumerate(self.stages + ["frame"])}
+        self.buffer = np.zeros((capacity, len(self.columns)))
+        self.position = 0 # Next row to write
+        self.count = 0 # Number of valid rows
+
+    def add_stage(self, name:str) -> None:
+        """Adds a column for a stage that wasn't declared"""
+        self.stages.append(name)
+        self.columns[name] = self.buffer.shape[1]
+        self.buffer = np.hstack((self.buffer, np.zeros((self.capacity, 1))))
+
+    def end_frame(self) -> dict:
+        """Writes the durations of the frame in the ring buffer"""
+        self.current["frame"] = time.perf_counter() - self.frame_start
+
+        row = self.buffer[self.position]
+        row[:] = 0.0
+        for name, duration in self.current.items():
+            if name not in self.columns:
+                self.add_stage(name)
+                row = self.buffer[self.position]
+            row[self.columns[name]] = duration
+
+        self.position = (self.position + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return self.current
+
+    def stage_names(self) -> list:
+        return self.stages + ["frame"]
+
+    def durations(self, name:str) -> np.ndarray:
+        """Durations of a stage for the frames of the buffer, from
+        the oldest to the most recent
+
+        Args:
+            name: Name of the stage
+        """
+        column = self.buffer[:, self.columns[name]]
+        if self.count < self.capacity:
+            return column[:self.count].copy()
+        return np.roll(column, -self.position)
+
+    def rolling_stats(self) -> dict:
+        """Mean, p95 and max of each stage in milliseconds over
+        the frames of the buffer"""
+        if self.count == 0:
+            return {}
+
+        window = self.buffer[:self.count] * 1000
+        means = window.mean(axis=0)
+        p95s = np.percentile(window, 95, axis=0)
+        maxs = window.max(axis=0)
+
+        return {name : {"mean" : float(means[i]), "p95" : float(p95s[i]),
+                        "max" : float(maxs[i])}
+                for name, i in self.columns.items()}
+
+    def dump(self, path:str) -> None:
+        """Saves the profile. A .csv path gets one line per frame
+        of the buffer, any other path gets a JSON file with the
+        statistics and the frames
+
+        Args:
+            path: Path of the file
+        """
+        names = self.stage_names()
+        frames = np.column_stack([self.durations(name) * 1000
+                                  for name in names])
+
+        if path.endswith(".csv"):
+            np.savetxt(path, frames, delimiter=",", fmt="%.4f",
+                       header=",".join(names), comments="")
+            return
+
+        with open(path, "w") as file:
+            json.dump({"unit" : "ms",
+                       "stats" : self.summary() if self.count else {},
+                       "stages" : names,
+                       "frames" : frames.round(4).tolist()}, file)
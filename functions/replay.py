@@ -0,0 +1,135 @@
+"""
+replay.py - Session record and replay module
+
+This module records the clicks of an interactive session together
+with the seeds of the random generators, then replays the session
+headless, step by step and as fast as possible. The replayed scene
+goes through exactly the same states as the recorded one, so the
+frame timings of different builds can be compared on the same
+workload.
+"""
+import json
+from functions.simulation import Simulation
+
+class SessionRecorder():
+    """Records a session of a Simulation.
+
+    The file is a compact JSON document: the parameters of the
+    scene (render size, step, rain, debug, turrets, maximum number
+    of mobs), the seeds of the subsystems, the clicks as
+    [step, x, y] triplets (in render coordinates, applied before
+    the step of that number) and the number of steps and the state
+    digest at the end of the recording.
+    """
+    version = 2 # The weather draws of version 1 sessions differ
+
+    def __init__(self, simulation:Simulation):
+        self.simulation = simulation
+        self.clicks = [] # [step, x, y]
+        simulation.recorder = self
+
+    def click(self, step:int, pos:tuple) -> None:
+        """Records a left click
+
+        Args:
+            step: Number of steps already run
+            pos: Coordinates of the click on the render surface
+        """
+        self.clicks.append([step, int(pos[0]), int(pos[1])])
+
+    def session(self) -> dict:
+        """Returns the recorded session as a dict"""
+        simulation = self.simulation
+        return {"version" : self.version,
+                "render_size" : list(simulation.screen.get_size()),
+                "step" : simulation.timestep.step,
+                "rain" : simulation.rain,
+                "debug" : simulation.debug,
+                "turrets" : simulation.turret_bank.centers.tolist(),
+                "max_living_mobs" : simulation.mobs.max_living_mobs,
+                "seeds" : simulation.seeds,
+                "clicks" : self.clicks,
+                "steps" : simulation.timestep.steps_done,
+                "digest" : simulation.state_digest()}
+
+    def save(self, path:str) -> None:
+        """Saves the session in a JSON file
+
+        Args:
+            path: Path of the file
+        """
+        with open(path, "w") as file:
+            json.dump(self.session(), file, separators=(",", ":"))
+
+def load_session(path:str) -> dict:
+    """Reads a session saved by SessionRecorder.save()
+
+    Args:
+        path: Path of the file
+
+    Returns:
+        dict: The session
+    """
+    with open(path) as file:
+        session = json.load(file)
+    if session.get("version") != SessionRecorder.version:
+        raise ValueError(f"Unsupported session version : {session.get('version')}")
+    return session
+
+def replay_session(screen, session:dict, render:bool = True,
+                   timer=None) -> Simulation:
+    """Replays a recorded session headless, without waiting for
+    the real time
+
+    Args:
+        screen: Surface of the recorded render size
+        session: Session returned by load_session()
+        render: If True the scene is drawn after each step, as
+        in an interactive frame
+        timer: FrameTimer measuring the stages of each step
+
+    Returns:
+        Simulation: The simulation at the end of the session,
+        its state_digest() can be compared with session["digest"]
+    """
+    if list(screen.get_size()) != session["render_size"]:
+        raise ValueError(f"The session was recorded at {session['render_size']}")
+
+    simulation = Simulation(screen, rain=session["rain"],
+                            debug=session["debug"], step=session["step"],
+                            turret_positions=[tuple(pos) for pos in session["turrets"]],
+                            seeds=session["seeds"])
+    simulation.timer = timer
+
+    # The mobs and the thunder are shared with the previous 
+    # simulations of the process
+    simulation.mobs.clear()
+    simulation.thunder.reset()
+    simulation.mobs.max_living_mobs = session["max_living_mobs"]
+    simulation.prefetch()
+
+    clicks = session["clicks"]
+    index = 0
+    for step in range(session["steps"]):
+        if timer is not None:
+            timer.begin_frame()
+
+        # The clicks are applied before the step they were
+        # recorded at, as in the interactive loop
+        with simulation.stage("events"):
+            while index < len(clicks) and clicks[index][0] <= step:
+                simulation.spawn_mob(tuple(clicks[index][1:]))
+                index += 1
+
+        simulation.step()
+        if render:
+            simulation.render()
+
+        if timer is not None:
+            timer.end_frame()
+
+    # Clicks of the last frame, after the last step
+    for click in clicks[index:]:
+        simulation.spawn_mob(tuple(click[1:]))
+
+    return simulation
@@ -0,0 +1,113 @@
+"""
+resolution.py - Resolution module
+
+This module separates the size of the window from the size at
+which the scene is drawn. The scene is rendered on an internal
+surface which is scaled once to the window at each frame, and the
+sizes tuned for the reference resolution (sprite scale factors,
+offsets of the reference points, distances in pixels) are
+converted to the internal resolution.
+"""
+from functions.display import pygame
+
+# Resolution for which the sprite scale factors and the distances
+# in pixels of the project were chosen
+REFERENCE_SIZE = (1200, 800)
+
+class Resolution():
+    """Internal render resolution and output window.
+
+    self.factor is the ratio between the internal resolution and
+    the reference one (the smallest of the two axes, so that the
+    sprites keep their proportions), self.stretch the ratios of
+    each axis, used by the images covering the whole screen.
+    Since the asset cache stores a sprite per scale factor, the
+    resized sprites of each resolution are cached separately.
+
+    When the internal surface has the size of the window, the
+    scene is drawn directly in the window and present() does
+    nothing.
+    """
+    def __init__(self, reference:tuple = REFERENCE_SIZE):
+        self.reference = tuple(reference)
+        self.window = None # Display surface
+        self.surface = None # Internal render surface
+        self.smooth = False # Bilinear filtering of the scaling
+        self.configure(self.reference)
+
+    def configure(self, render_size:tuple) -> None:
+        """Sets the internal resolution and computes the scale
+        factors from the reference resolution
+
+        Args:
+            render_size: Size of the internal surface
+        """
+        self.render_size = tuple(render_size)
+        ratio_x = self.render_size[0] / self.reference[0]
+        ratio_y = self.render_size[1] / self.reference[1]
+        self.factor = min(ratio_x, ratio_y)
+        self.stretch = 1.0 if ratio_x == ratio_y == 1 else (ratio_x, ratio_y)
+
+    def open(self, window_size:tuple, render_size:tuple = None,
+             flags:int = 0) -> pygame.surface.Surface:
+        """Opens the window and returns the surface to draw on
+
+        Args:
+            window_size: Size of the window
+            render_size: Internal resolution, the window size if None
+            flags: Flags of pygame.display.set_mode()
+
+        Returns:
+            pygame.surface.Surface: The internal render surface
+        """
+        self.window = pygame.display.set_mode(window_size, flags)
+        if render_size is None or tuple(render_size) == self.window.get_size():
+            self.surface = self.window
+        else:
+            self.surface = pygame.Surface(render_size).convert()
+
+        self.configure(self.surface.get_size())
+        return self.surface
+
+    @property
+    def scaled(self) -> bool:
+        """True if the scene is rendered at another size than the
+        window"""
+        return self.window is not None and self.surface is not self.window
+
+    def scale(self, coef:float) -> float:
+        """Converts a sprite scale factor chosen for the reference
+        resolution. The result is rounded so that the asset cache
+        keys stay the same from one launch to another
+
+        Args:
+            coef: Scale factor at the reference resolution
+        """
+        return round(coef * self.factor, 4)
+
+    def length(self, pixels:float) -> float:
+        """Converts a distance in pixels at the reference resolution"""
+        return pixels * self.factor
+
+    def to_render(self, pos:tuple) -> tuple:
+        """Converts window coordinates (mouse) to coordinates of
+        the internal surface"""
+        if not self.scaled:
+            return pos
+        window_w, window_h = self.window.get_size()
+        return (int(pos[0] * self.render_size[0] / window_w),
+                int(pos[1] * self.render_size[1] / window_h))
+
+    def present(self) -> None:
+        """Scales the internal surface to the window, the display
+        must then be updated"""
+        if not self.scaled:
+            return
+        scale = pygame.transform.smoothscale if self.smooth else pygame.transform.scale
+        scale(self.surface, self.window.get_size(), self.window)
+
+resolution = Resolution()
+
+def get_resolution() -> Resolution:
+    """ Allows other modules to retrieve the resolution object """
+    return resolution
@@ -0,0 +1,432 @@
+"""
+simulation.py - Simulation module
+
+Module running the scene. The states of the turrets, the mobs and
+the weather are updated with a fixed time step, driven by the real
+elapsed time, while the display is refreshed once per frame by
+interpolating between the two last states. In headless mode the
+steps are chained as fast as possible, without display.
+Optionally, only the regions of the screen which changed are
+refreshed (dirty rectangles). The scene can be rendered at another
+resolution than the window (see resolution.py).
+"""
+import sys
+import time
+import random
+import hashlib
+from contextlib import nullcontext
+from functions.display import pygame, get_mobs
+from functions.display import TurretSprites, RotatedSpriteCache
+from functions.display import background, turret_base_sprite, debug_mode
+from functions.geometry import np, RefPointTable
+from functions.animation import MakeItRain, get_sounds, get_thunder
+from functions.turrets import TurretBank
+from functions.timing import FixedTimestep
+from functions.profiler import FrameProfiler
+from functions.dirty import DirtyRects
+from functions.resolution import get_resolution
+from functions.weather import WeatherScheduler
+
+# Subsystems having their own random generator
+SEED_NAMES = ("mobs", "projectiles", "thunder", "rain")
+
+class Simulation():
+    """Brings together all the objects of the scene and runs
+    the main loop.
+
+    update() advances the scene by one fixed step of
+    self.timestep.step seconds: rotation, detection, projectile,
+    blast and weather. render() draws the scene between the two
+    last steps. Both are independent so the behaviour of the
+    turrets doesn't depend on the frame rate.
+
+    The turrets are placed at 'turret_positions', by default a 
+    single turret at the center of the screen.
+    
+    When a FrameTimer is assigned to self.timer, the time spent 
+    in each stage of the loop is recorded. The timings of a 
+    FrameProfiler are also displayed in debug mode.
+
+    With 'dirty_rects', render() only restores and redraws the 
+    regions of the moving elements and present() sends only these 
+    regions to the display. The rain covers the whole screen, so 
+    the scene falls back to full frames while it is enabled.
+
+    'screen' is the surface the scene is drawn on, the internal 
+    render surface returned by Resolution.open() when the window 
+    has another size. The sprites and the distances are adapted 
+    to its size. A scaled scene is always sent in full frames.
+
+    Each random subsystem (mobs, projectiles, thunder, rain) 
+    draws from its own generator, seeded from 'seeds'. With the 
+    same seeds and the same clicks at the same steps, two runs 
+    give the same scene (see replay.py). When a SessionRecorder 
+    is assigned to self.recorder, the clicks are recorded.
+    """
+    def __init__(self, screen:pygame.surface.Surface, rain:bool = True,
+                 debug:bool = False, step:float = 1/60,
+                 sprite_cache:RotatedSpriteCache = None,
+                 turret_positions:list = None, dirty_rects:bool = False,
+                 seeds:dict = None):
+        self.screen = screen
+        self.WIDTH = screen.get_width()
+        self.HEIGHT = screen.get_height()
+
+        # The sizes of the scene follow the render resolution, it 
+        # must be known before any sprite is loaded
+        self.resolution = get_resolution()
+        self.resolution.configure(screen.get_size())
+
+        self.rain = rain
+        self.debug = debug
+        self.clock = pygame.time.Clock()
+        self.timestep = FixedTimestep(step)
+        self.timer = None # FrameTimer object
+        self.recorder = None # SessionRecorder object
+        self.no_timer = nullcontext()
+
+        # Classes
+        self.turrets = TurretSprites()
+        self.mobs = get_mobs()
+        self.rainfall = MakeItRain(screen)
+        self.sounds = get_sounds()
+        self.thunder = get_thunder()
+        if sprite_cache is None:
+            sprite_cache = RotatedSpriteCache()
+        self.sprite_cache = sprite_cache
+
+        # The weather follows the simulated time, the gusts of 
+        # wind and the lightning share one scheduler
+        self.weather = WeatherScheduler()
+        self.rainfall.time_source = self.timestep.now
+        self.thunder.time_source = self.timestep.now
+        self.rainfall.weather = self.weather
+        self.thunder.reset(self.weather)
+
+        # BACKGROUND
+        self.background_img = background()
+
+        if turret_positions is None:
+            turret_positions = [(self.WIDTH//2, self.HEIGHT//2)]
+
+        # TURRET BASES
+        self.turret_base = turret_base_sprite()
+        self.turret_base_rects = [self.turret_base.get_rect(center=pos)
+                                  for pos in turret_positions]
+
+        # TURRET
+        turret_rect = self.turrets.turret_sentinel.get_rect()
+        turret_rect.center = (self.WIDTH//2, self.HEIGHT//2)
+
+        # REFERENCE POINTS
+        # All the reference points are precomputed for every 0.1°
+        # of rotation, only a lookup is done at each step. The 
+        # table is shared by all the turrets
+        self.ref_table = RefPointTable(screen, turret_rect, resolution=0.1,
+                                       scale=self.resolution.factor)
+
+        # TURRETS
+        self.turret_bank = TurretBank(screen, self.turrets, self.ref_table,
+                                      sprite_cache)
+        for pos in turret_positions:
+            self.turret_bank.add(pos)
+        self.refs = self.turret_bank.refs(0)
+
+        # STATIC LAYER
+        # Everything which never moves is drawn once in a surface
+        # copied at each frame
+        self.static_layer = self.build_static_layer()
+        self.dirty = DirtyRects(screen, self.static_layer) if dirty_rects else None
+
+        self.seed(seeds)
+
+    def seed(self, seeds:dict = None) -> None:
+        """Seeds the random generator of each subsystem
+
+        Args:
+            seeds: Seed of each name of SEED_NAMES, new random 
+            seeds if None. They are kept in self.seeds
+        """
+        if seeds is None:
+            seeds = {name: random.randrange(2**32) for name in SEED_NAMES}
+        self.seeds = {name: int(seeds[name]) for name in SEED_NAMES}
+
+        self.mobs.rng.seed(self.seeds["mobs"])
+        self.turret_bank.projectiles.rng.seed(self.seeds["projectiles"])
+        self.thunder.rng.seed(self.seeds["thunder"])
+        self.rainfall.rng = np.random.default_rng(self.seeds["rain"])
+        self.rainfall.generate_raindrops()
+
+    def state_digest(self) -> str:
+        """Returns a hash of the state of the scene (mobs, turrets,
+        animations, weather), two runs with the same digest at the 
+        same step had the same outcome"""
+        table = self.mobs.table
+        bank = self.turret_bank
+        count = table.count
+        arrays = [table.pos[:count], table.sprite[:count], table.state[:count],
+                  bank.angles, bank.modes, bank.shot_fired,
+                  bank.projectiles.pos[bank.projectiles.active],
+                  bank.explosions.pos[bank.explosions.active],
+                  self.rainfall.x, self.rainfall.y]
+        digest = hashlib.sha1()
+        for array in arrays:
+            digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update(repr((self.thunder.lightning_displayed, 
+                            self.rainfall.strong_wind_displayed)).encode())
+        return digest.hexdigest()
+
+    def build_static_layer(self) -> pygame.surface.Surface:
+        """Draws the elements which never move : the background
+        and the turret bases (only the background color in debug
+        mode)
+
+        Returns:
+            pygame.surface.Surface: Layer of the size of the screen
+        """
+        layer = self.screen.copy()
+        layer.fill((25, 25, 25))
+
+        # If debug mode is activated the background and the
+        # turret bases aren't displayed
+        if not self.debug:
+            layer.blit(self.background_img, (0,0))
+            layer.blits([(self.turret_base, rect) 
+                         for rect in self.turret_base_rects], 
+                        doreturn=False)
+        return layer
+
+    def full_frames(self) -> bool:
+        """True if the whole screen is redrawn at each frame"""
+        return self.dirty is None or self.rain or self.resolution.scaled
+
+    def prefetch(self, sound_names:list = None) -> None:
+        """Loads in advance the assets that are otherwise loaded 
+        on first use (mob sprites, blast frames, lightning image 
+        and sounds), so that their loading doesn't happen during 
+        a frame
+
+        Args:
+            sound_names: Names of the sounds to decode, all of 
+            them if None
+        """
+        self.mobs.load()
+        self.turret_bank.explosions.load()
+        if self.rain:
+            self.thunder.load()
+        self.sounds.prefetch(sound_names)
+
+    def stage(self, name:str):
+        """Returns the timing scope of a stage of the loop, or 
+        an empty context if no timer is set
+
+        Args:
+            name: Name of the stage
+        """
+        if self.timer is None:
+            return self.no_timer
+        return self.timer.scope(name)
+
+    def spawn_mob(self, pos:tuple) -> int:
+        """Adds a mob at the given position (left click)
+
+        Args:
+            pos: Coordinates of the mob
+
+        Returns:
+            int: Id of the new mob, None if it couldn't appear
+        """
+        return self.mobs.add_mob(pos, self.turret_base_rects, self.refs)
+
+    def handle_event(self, event:pygame.event.Event) -> None:
+        """Processes a Pygame event
+
+        Args:
+            event: The event to process
+        """
+        # End of a sound
+        if self.sounds.handle_event(event):
+            return
+
+        if event.type == pygame.QUIT:
+            pygame.quit()
+            sys.exit()
+
+        # LEFT CLICK
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            pos = self.resolution.to_render(event.pos)
+            if self.recorder is not None:
+                self.recorder.click(self.timestep.steps_done, pos)
+            self.spawn_mob(pos)
+
+        # RIGHT CLICK
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 3:
+            pass
+
+    def update(self, dt:float) -> None:
+        """Advances the scene by one simulation step
+
+        Args:
+            dt: Duration of the step in seconds
+        """
+        turret_bank = self.turret_bank
+
+        # Runs the actions of the current mode of every turret and
+        # rotates them by one step, their reference points are 
+        # updated at the new angles
+        with self.stage("rotate"):
+            turret_bank.update(dt, self.mobs)
+
+        with self.stage("ref_points"):
+            self.refs = turret_bank.refs(0)
+
+        # Sets the modes according to the mobs crossed by the 
+        # laser and cannon segments of all the turrets
+        with self.stage("detection"):
+            turret_bank.detect(self.mobs)
+
+        # Rain, wind and lightning
+        if self.rain:
+            with self.stage("rain"):
+                self.rainfall.update(dt)
+
+    def step(self) -> None:
+        """Runs one simulation step and records it"""
+        # Sounds which ended since the previous step, if the main 
+        # loop didn't read their events
+        self.sounds.poll()
+        self.update(self.timestep.step)
+        self.timestep.tick()
+
+    def render(self, alpha:float = 1.0) -> None:
+        """Draws the scene between the two last simulation steps
+
+        Args:
+            alpha: Interpolation factor (0.0 to 1.0)
+        """
+        screen = self.screen
+        turret_bank = self.turret_bank
+        angles = turret_bank.interpolate(alpha)
+        with self.stage("ref_points"):
+            points = self.ref_table.points_batch(angles, turret_bank.centers)
+
+        # Erase screen, entirely or only where the elements of the
+        # previous frame were drawn
+        full = self.full_frames()
+        with self.stage("background"):
+            if full:
+                screen.blit(self.static_layer, (0,0))
+                if self.dirty is not None:
+                    self.dirty.invalidate()
+            else:
+                self.dirty.restore()
+
+        # Display of living mobs
+        with self.stage("mobs"):
+            rects = self.mobs.draw(screen)
+
+        # Projectiles, explosions and turrets
+        with self.stage("rotate"):
+            rects += turret_bank.draw(screen, angles, alpha)
+
+        # Displays the laser segments
+        with self.stage("laser"):
+            rects += turret_bank.draw_lasers(screen, angles, points)
+
+        # Displaying rain
+        if self.rain:
+            with self.stage("rain"):
+                self.rainfall.draw()
+
+        # Displaying debug mode
+        if self.debug:
+            if isinstance(self.timer, FrameProfiler):
+                profiler = self.timer
+            else:
+                profiler = None
+            
+            with self.stage("overlay"):
+                refs = [turret_bank.refs(index, points) 
+                        for index in range(len(turret_bank))]
+                rects += debug_mode(screen, refs, self.turret_base.get_rect(),
+                                    turret_bank, self.mobs, self.sounds,
+                                    self.thunder, self.rainfall, self.clock,
+                                    self.sprite_cache, profiler)
+
+        if not full:
+            self.dirty.record(rects)
+
+    def present(self) -> None:
+        """Updates the display, entirely or only with the regions
+        changed since the previous frame. A scene rendered at 
+        another resolution is first scaled to the window"""
+        if self.resolution.scaled:
+            self.resolution.present()
+            pygame.display.flip()
+        elif self.dirty is None:
+            pygame.display.flip()
+        else:
+            self.dirty.present()
+
+    def run(self, fps:int = 60) -> None:
+        """Interactive main loop. The display is limited to 'fps'
+        frames per second, the number of simulation steps of each
+        frame depends on the real elapsed time
+
+        Args:
+            fps: Maximum number of frames per second
+        """
+        # The sound commands of the steps of a frame are sent 
+        # together at the end of the steps
+        self.sounds.deferred = True
+
+        self.clock.tick()
+        while True:
+            elapsed = self.clock.tick(fps) / 1000
+            if self.timer is not None:
+                self.timer.begin_frame()
+
+            with self.stage("events"):
+                for event in pygame.event.get():
+                    self.handle_event(event)
+
+            for _ in range(self.timestep.advance(elapsed)):
+                self.step()
+            self.sounds.flush()
+
+            self.render(self.timestep.alpha)
+
+            # Display upadate
+            with self.stage("flip"):
+                self.present()
+
+            if self.timer is not None:
+                self.timer.end_frame()
+
+    def run_headless(self, seconds:float, render:bool = False) -> float:
+        """Runs 'seconds' of simulated time as fast as possible,
+        without waiting for the real time
+
+        Args:
+            seconds: Simulated duration in seconds
+            render: If True the scene is also drawn after each
+            step (on the screen surface, without display update)
+
+        Returns:
+            float: Real duration of the run in seconds
+        """
+        steps = int(round(seconds / self.timestep.step))
+
+        start = time.perf_counter()
+        for _ in range(steps):
+            if self.timer is not None:
+                self.timer.begin_frame()
+
+            self.step()
+            if render:
+                self.render()
+                
+            if self.timer is not None:
+                self.timer.end_frame()
+
+        return time.perf_counter() - start
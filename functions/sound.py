@@ -22,18 +22,171 @@ strong wind : Edited from a sound made by @xxamoney27xx
 thunder : @Kinoton
 music : @SoundFlakes
 """
+import os
+from collections import deque
 from functions.display import pygame
+from functions.assets import get_assets
 
-pygame.mixer.init()
+assets = get_assets()
+
+# States of the sounds
+STOPPED, PLAYING, FADING = range(3)
+
+class SoundStream():
+    """Long sound played from its decoded samples on disk (PCM 
+    file of the AssetCache), one chunk at a time.
+
+    Only the chunk being played and the next one, queued on the 
+    channel (Channel.queue), are kept in memory, in a ring of 
+    'ring' chunks of 'chunk_seconds' seconds. When a chunk ends 
+    the channel starts the queued one and posts its end event, 
+    feed() then queues the following chunk. The object can be 
+    used in place of a pygame.mixer.Sound for set_volume() and 
+    get_length().
+    """
+    def __init__(self, pcm_path:str, offset:int, chunk_seconds:float = 1.0,
+                 ring:int = 3):
+        frequency, size, channels = pygame.mixer.get_init()
+        self.frame_bytes = abs(size) // 8 * channels
+        self.chunk_bytes = int(frequency * chunk_seconds) * self.frame_bytes
+        
+        self.path = pcm_path
+        self.offset = offset # Size of the header of the file
+        self.data_bytes = os.path.getsize(pcm_path) - offset
+        self.length = self.data_bytes / (frequency * self.frame_bytes)
+        
+        self.volume = 1.0
+        self.file = None # Opened at the first playback
+        self.active = False # Chunks are still to be queued
+        self.chunks = deque(maxlen=ring) # (Sound, bytes)
+        
+        # Played after a fadeout instead of the queued chunk
+        self.silence = pygame.mixer.Sound(buffer=bytes(self.frame_bytes * 64))
+
+    def get_length(self) -> float:
+        """Returns the duration of the sound in seconds"""
+        return self.length
+
+    def set_volume(self, volume:float) -> None:
+        """Sets the volume of the next chunks"""
+        self.volume = volume
+
+    def next_chunk(self) -> pygame.mixer.Sound:
+        """Reads the next chunk of samples, None at the end"""
+        data = self.file.read(self.chunk_bytes)
+        if not data:
+            self.active = False
+            return None
+        chunk = pygame.mixer.Sound(buffer=data)
+        chunk.set_volume(self.volume)
+        self.chunks.append((chunk, len(data)))
+        return chunk
+
+    def start(self, channel:pygame.mixer.Channel) -> None:
+        """Plays the sound from the start on a channel"""
+        if self.file is None:
+            self.file = open(self.path, "rb")
+        self.file.seek(self.offset)
+        self.chunks.clear()
+        self.active = True
+        
+        # Stopping the channel also drops its queued chunk
+        channel.stop()
+        channel.play(self.next_chunk())
+        self.feed(channel)
+
+    def feed(self, channel:pygame.mixer.Channel) -> bool:
+        """Queues the next chunk if the channel has none queued
+
+        Returns:
+            bool: False when all the chunks have been queued
+        """
+        if not self.active:
+            return False
+        if channel.get_queue() is not None:
+            return True
+        chunk = self.next_chunk()
+        if chunk is None:
+            return False
+        channel.queue(chunk)
+        return True
+
+    def stop(self, channel:pygame.mixer.Channel) -> None:
+        """Stops the sound immediately"""
+        self.active = False
+        channel.stop()
+
+    def fadeout(self, channel:pygame.mixer.Channel, time:int) -> None:
+        """Stops the sound after a fadeout of 'time' milliseconds"""
+        self.active = False
+        channel.fadeout(time)
+        # The channel plays its queued sound at the end of a 
+        # fadeout, the queued chunk is replaced by a short silence
+        channel.queue(self.silence)
+
+    def resident(self) -> int:
+        """Bytes of samples kept in memory at the moment"""
+        return sum(size for _, size in self.chunks)
+
+    def buffer_bytes(self) -> int:
+        """Bytes of samples kept in memory during the playback: 
+        the full ring of chunks and the silence of the fadeouts"""
+        chunk = min(self.chunk_bytes, self.data_bytes)
+        return self.chunks.maxlen * chunk + len(self.silence.get_raw())
+
+class Voice():
+    """Channel of the voice pool and the sound it plays"""
+    def __init__(self, channel:pygame.mixer.Channel):
+        self.channel = channel
+        self.name = None # Sound played, None when the voice is free
+        self.order = 0 # Start counter, the oldest voice has the lowest
+        self.fading = False
+        self.volume = 1.0 # Volume of the channel
+        self.stream = None # SoundStream fed on this voice
 
 class SoundManager():
-    """Class loading all the sounds likely to be used, allowing 
-    them to be manipulated and played via class functions.
+    """Class giving access to all the sounds likely to be used, 
+    allowing them to be manipulated and played via class functions.
     
-    Each sound has its own channel and it's these channels that 
-    are manipulated. This allows, among other things, to know if 
-    a specific sound is being played by checking if its channel 
-    is busy.
+    The sounds are played on a pool of self.voice_count channels 
+    (voices) shared by all of them, so that several instances of 
+    a sound can overlap (multiple shots and explosions) while the 
+    number of sounds mixed at the same time stays bounded. A sound 
+    can be played on at most self.max_instances voices (1 by 
+    default), beyond that its oldest instance is restarted. When 
+    all the voices are busy, a voice is stolen from the sounds of 
+    the lowest self.priority, if it isn't higher than the one of 
+    the new sound: the fading voices first, then the quietest, 
+    then the oldest. Otherwise the new sound is dropped.
+
+    Nothing is loaded when the object is created: the mixer and 
+    the voices are initialized at the first sound played and 
+    each sound is decoded the first time it's used (see 
+    prefetch() to decode some of them in advance).
+
+    The state of each sound (STOPPED, PLAYING or FADING) is kept 
+    in self.state rather than asked to the mixer: it changes with 
+    the commands and each voice posts its own event type when its 
+    sound ends (Channel.set_endevent), the sound is stopped when 
+    none of its voices is left. in_playing() is then a simple 
+    lookup, and a stop or a fadeout of a sound which isn't 
+    playing costs nothing. The end events are processed by 
+    handle_event() when the main loop reads them, or by poll().
+    
+    When self.deferred is True, the commands are only recorded 
+    and flush() sends them once per frame. The plays are all kept, 
+    up to the instance limit of the sound, so that the instances 
+    started during the same frame still overlap, while a stop or 
+    a fadeout replaces the commands recorded before it: the 
+    repeated stops and fadeouts of a sound cost at most one call 
+    per frame. self.mixer_calls counts the calls.
+
+    The long ambience loops (self.streamed) are played as 
+    SoundStream objects when self.streaming is True : they are 
+    decoded once in the asset cache and read from it chunk by 
+    chunk instead of being kept in memory. A stream has a single 
+    instance, fed on its voice. memory_report() gives the memory 
+    used by each sound.
     """    
     def __init__(self):
         # Paths
@@ -63,69 +216,442 @@ class SoundManager():
             "strong_wind" : 0.85
         }
         
-        # Sounds
+        # Voice pool, a higher priority can steal the voices of 
+        # a lower one (1 by default). The ambience loops are 
+        # never interrupted by the effects
+        self.voice_count = 16
+        self.priority = {
+            "rain" : 3,
+            "wind" : 3,
+            "strong_wind" : 3,
+            "sentinel" : 2,
+            "alert" : 2,
+            "deploy" : 2,
+            "retract" : 2,
+            "thunder" : 2,
+            "fire" : 1,
+            "blast" : 1,
+            "spawn" : 0,
+            "steam" : 0
+        }
+        
+        # Instances of a sound playing at the same time (1 by 
+        # default)
+        self.max_instances = {
+            "deploy" : 2,
+            "fire" : 4,
+            "blast" : 4,
+            "spawn" : 2
+        }
+        
+        # Sounds and voices, filled on first use
         self.sounds = {}
-        for key, path in self.paths.items():
-            snd = pygame.mixer.Sound(path)
-            if key in self.sound_adjust.keys():
-                snd.set_volume(self.sound_adjust[key])
-            self.sounds[key] = snd
+        self.voices = []
+        self.volumes = {} # Channel volume of each sound
+        self.started = 0 # Voices started since the beginning
+        self.stolen = 0 # Voices taken from another sound
+        self.dropped = 0 # Sounds not played, no voice available
+        
+        # Sounds streamed from the asset cache
+        self.streamed = {"rain", "wind", "strong_wind"}
+        self.streaming = True
+        self.stream_chunk = 1.0 # Seconds
+        
+        # Sound states and end event types
+        self.state = {key: STOPPED for key in self.paths}
+        self.end_events = {} # Event type : voice
+        
+        # Commands waiting for flush(), sound name : list of 
+        # (command, argument), and states before the first of them
+        self.deferred = False
+        self.pending = {}
+        self.previous = {}
+        self.mixer_calls = 0
+
+    def is_streamed(self, sound_name:str) -> bool:
+        """True if the sound is played as a SoundStream, which 
+        needs the asset cache"""
+        return (self.streaming and sound_name in self.streamed and 
+                assets.asset_cache.enabled)
+
+    def get_sound(self, sound_name:str) -> pygame.mixer.Sound:
+        """Returns a sound, decoded the first time it's requested,
+        or a SoundStream for the streamed sounds
+
+        Args:
+            sound_name: The sound name
+        """
+        if sound_name not in self.sounds:
+            path = self.paths[sound_name]
+            if self.is_streamed(sound_name):
+                assets.init_mixer()
+                asset_cache = assets.asset_cache
+                pcm_path = asset_cache.decode_pcm(path, pygame.mixer.get_init())
+                snd = SoundStream(pcm_path, asset_cache.pcm_header.size,
+                                  self.stream_chunk)
+            else:
+                snd = assets.sound(path)
+            if sound_name in self.sound_adjust.keys():
+                snd.set_volume(self.sound_adjust[sound_name])
+            self.sounds[sound_name] = snd
+        return self.sounds[sound_name]
+
+    def init_voices(self) -> None:
+        """Initializes the mixer and reserves the channels of the 
+        voice pool"""
+        assets.init_mixer()
+        pygame.mixer.set_num_channels(self.voice_count)
+        self.voices = [Voice(pygame.mixer.Channel(i)) for i in range(self.voice_count)]
+        
+        # Each voice posts its own event type when its sound ends
+        self.end_events = {}
+        for voice in self.voices:
+            event_type = pygame.event.custom_type()
+            voice.channel.set_endevent(event_type)
+            self.end_events[event_type] = voice
+
+    def prefetch(self, sound_names:list = None) -> None:
+        """Decodes sounds in advance, so that their first playback
+        doesn't slow down a frame
+
+        Args:
+            sound_names: Names of the sounds, all of them if None
+        """
+        if sound_names is None:
+            sound_names = self.paths.keys()
+        for sound_name in sound_names:
+            self.get_sound(sound_name)
+
+    def instances(self, sound_name:str) -> list:
+        """Returns the voices playing a sound"""
+        return [voice for voice in self.voices if voice.name == sound_name]
+
+    def loudness(self, voice:Voice) -> float:
+        """Volume at which a voice is heard, 0 when it fades out"""
+        if voice.fading:
+            return 0.0
+        return voice.volume * self.sound_adjust.get(voice.name, 1.0)
+
+    def instance_limit(self, sound_name:str) -> int:
+        """Maximum number of instances of a sound, a stream is 
+        always played on its own voice"""
+        if self.is_streamed(sound_name):
+            return 1
+        return self.max_instances.get(sound_name, 1)
+
+    def allocate(self, sound_name:str) -> Voice:
+        """Chooses the voice on which a sound will be played
+
+        Args:
+            sound_name: The sound name
+
+        Returns:
+            Voice: A free or stolen voice, None if the sound can't 
+            be played
+        """
+        # A sound at its instance limit restarts its oldest voice, 
+        # a stream is always played on its own voice
+        instances = self.instances(sound_name)
+        if len(instances) >= self.instance_limit(sound_name):
+            return self.release(min(instances, key=lambda voice: voice.order))
+        
+        for voice in self.voices:
+            if voice.name is None:
+                return voice
+        
+        # Voice stealing among the sounds of lower or equal 
+        # priority: fading voices, then quietest, then oldest
+        priority = self.priority.get(sound_name, 1)
+        candidates = [voice for voice in self.voices 
+                      if self.priority.get(voice.name, 1) <= priority]
+        if not candidates:
+            return None
+        victim = min(candidates, key=lambda voice: (self.priority.get(voice.name, 1),
+                                                    self.loudness(voice), voice.order))
+        self.stolen += 1
+        return self.release(victim)
+
+    def release(self, voice:Voice) -> Voice:
+        """Frees a voice, its sound is stopped if it has no other 
+        voice. A streamed sound is stopped on the channel, which 
+        also drops its queued chunk; any other sound is simply 
+        replaced by the next one played on the channel
+
+        Args:
+            voice: The voice to free
+
+        Returns:
+            Voice: The same voice
+        """
+        sound_name = voice.name
+        if voice.stream is not None:
+            voice.stream.stop(voice.channel)
+            self.mixer_calls += 1
+        voice.name = None
+        voice.stream = None
+        voice.fading = False
+        if (sound_name is not None and not self.instances(sound_name) and 
+            not self.play_pending(sound_name)):
+            self.state[sound_name] = STOPPED
+        return voice
+
+    def play_pending(self, sound_name:str) -> bool:
+        """True if a play of the sound waits for flush()"""
+        return ("play", None) in self.pending.get(sound_name, ())
 
-        # Channels
-        pygame.mixer.set_num_channels(len(self.paths))
-        self.channels = {key: pygame.mixer.Channel(i) for i, key in enumerate(self.sounds)}
+    def command(self, sound_name:str, command:str, argument=None,
+                state:int = STOPPED) -> None:
+        """Sends a command to the voices of a sound, or records it
+        for flush() in deferred mode
+
+        Args:
+            sound_name: The sound name
+            command: "play", "stop" or "fadeout"
+            argument: Fadeout time in milliseconds
+            state: New state of the sound
+        """
+        previous = self.state[sound_name]
+        self.state[sound_name] = state
+        if self.deferred:
+            self.previous.setdefault(sound_name, previous)
+            commands = self.pending.setdefault(sound_name, [])
+            if command != "play":
+                # The plays recorded before would be interrupted
+                commands.clear()
+            elif (sum(recorded == "play" for recorded, _ in commands) >= 
+                  self.instance_limit(sound_name)):
+                # Beyond the limit, the instances started by the 
+                # same frame would interrupt each other
+                return
+            commands.append((command, argument))
+        else:
+            self.send(sound_name, command, argument, previous)
+
+    def send(self, sound_name:str, command:str, argument,
+             previous:int) -> None:
+        """Calls the mixer for a command: a play starts a new 
+        instance of the sound, a stop or a fadeout applies to all 
+        its instances and is only sent if the sound was playing 
+        before
+
+        Args:
+            sound_name: The sound name
+            command: "play", "stop" or "fadeout"
+            argument: Fadeout time in milliseconds
+            previous: State of the sound before the command
+        """
+        if command == "play":
+            self.start(sound_name)
+        elif command == "stop" and previous != STOPPED:
+            for voice in self.instances(sound_name):
+                if voice.stream is None:
+                    voice.channel.stop()
+                    self.mixer_calls += 1
+                self.release(voice)
+        elif command == "fadeout" and previous == PLAYING:
+            for voice in self.instances(sound_name):
+                # A voice which already went idle has nothing to 
+                # fade and won't post another end event
+                if not voice.channel.get_busy():
+                    self.release(voice)
+                    continue
+                if voice.stream is not None:
+                    voice.stream.fadeout(voice.channel, argument)
+                else:
+                    voice.channel.fadeout(argument)
+                voice.fading = True
+                self.mixer_calls += 1
+
+        # The voices may have been stolen or dropped in the meantime
+        if not self.instances(sound_name):
+            self.state[sound_name] = STOPPED
+
+    def start(self, sound_name:str) -> None:
+        """Plays a new instance of a sound on a voice of the pool
+
+        Args:
+            sound_name: The sound name
+        """
+        if not self.voices:
+            self.init_voices()
+        sound = self.get_sound(sound_name)
+        voice = self.allocate(sound_name)
+        if voice is None:
+            self.dropped += 1
+            return
+        
+        volume = self.volumes.get(sound_name, 1.0)
+        if voice.volume != volume:
+            voice.channel.set_volume(volume)
+            voice.volume = volume
+        
+        if isinstance(sound, SoundStream):
+            sound.start(voice.channel)
+            voice.stream = sound
+        else:
+            voice.channel.play(sound)
+        self.mixer_calls += 1
+        
+        self.started += 1
+        voice.name = sound_name
+        voice.order = self.started
+        self.state[sound_name] = PLAYING
+
+    def flush(self) -> None:
+        """Sends the commands recorded for each sound"""
+        pending = self.pending
+        self.pending = {}
+        for sound_name, commands in pending.items():
+            for command, argument in commands:
+                self.send(sound_name, command, argument, self.previous[sound_name])
+        self.previous.clear()
+
+    def handle_event(self, event:pygame.event.Event) -> bool:
+        """Updates the state of a voice whose sound ended
+
+        Args:
+            event: Pygame event read by the main loop
+
+        Returns:
+            bool: True if it was an end event of a voice
+        """
+        voice = self.end_events.get(event.type)
+        if voice is None:
+            return False
+        
+        if voice.name is not None:
+            self.voice_ended(voice)
+        return True
+
+    def voice_ended(self, voice:Voice) -> None:
+        """Updates a voice after an end event: a streamed sound 
+        receives its next chunk, otherwise the voice is freed if 
+        its channel is no longer busy (a voice restarted or stolen 
+        also posts the event of the interrupted sound)
+
+        Args:
+            voice: The voice
+        """
+        if voice.stream is not None and voice.stream.feed(voice.channel):
+            return
+        if not voice.channel.get_busy():
+            voice.stream = None
+            self.release(voice)
+
+    def stream(self, sound_name:str) -> SoundStream:
+        """Returns the SoundStream of a sound, None if it isn't 
+        streamed"""
+        sound = self.sounds.get(sound_name)
+        return sound if isinstance(sound, SoundStream) else None
+
+    def poll(self) -> None:
+        """Processes the end events when no main loop reads the 
+        events (headless runs)"""
+        if not self.end_events:
+            return
+        if pygame.display.get_init():
+            for event in pygame.event.get(list(self.end_events)):
+                self.handle_event(event)
+        else:
+            # No event queue, the mixer is asked directly
+            for voice in self.voices:
+                if voice.name is not None:
+                    self.voice_ended(voice)
 
     def play_sound(self, sound_name:str) -> None:
-        if sound_name in self.sounds and sound_name in self.channels:
-            self.channels[sound_name].play(self.sounds[sound_name])
+        """Plays a new instance of a sound
+
+        Args:
+            sound_name: The sound name
+        """
+        if sound_name not in self.paths:
+            return
+        self.command(sound_name, "play", state=PLAYING)
 
     def pause_sound(self, sound_name:str) -> None:
-        if sound_name in self.channels:
-            self.channels[sound_name].pause()
+        for voice in self.instances(sound_name):
+            voice.channel.pause()
     
     def unpause_sound(self, sound_name:str) -> None:
-        if sound_name in self.channels:
-            self.channels[sound_name].unpause()
+        for voice in self.instances(sound_name):
+            voice.channel.unpause()
     
     def stop_sound(self, sound_name:str) -> None:
-        """Stop playback of a channel immediatly
+        """Stop playback of all the instances of a sound 
+        immediatly
 
         Args:
             sound_name: The sound name
         """        
-        if sound_name in self.channels:
-            self.channels[sound_name].stop()
+        if self.state.get(sound_name, STOPPED) != STOPPED:
+            self.command(sound_name, "stop", state=STOPPED)
     
     def set_volume(self, sound_name:str, volume:float) -> None:
-        if sound_name in self.channels:
-            self.channels[sound_name].set_volume(volume)
+        self.volumes[sound_name] = volume
+        for voice in self.instances(sound_name):
+            voice.channel.set_volume(volume)
+            voice.volume = volume
 
     def get_volume(self, sound_name:str) -> float:
-        if sound_name in self.channels:
-            self.channels[sound_name].get_volume()
+        return self.volumes.get(sound_name, 1.0)
     
     def fadeout(self, sound_name:str, time:int) -> None:
-        """Stop playback of a channel after fading out the sound 
-        over the given time argument in milliseconds
+        """Stop playback of all the instances of a sound after 
+        fading them out over the given time argument in 
+        milliseconds
 
         Args:
             sound_name: The sound name
             time: Fadout time in milliseconds
         """        
-        if sound_name in self.channels:
-            self.channels[sound_name].fadeout(time)
+        if self.state.get(sound_name, STOPPED) == PLAYING:
+            self.command(sound_name, "fadeout", time, state=FADING)
+
+    def get_length(self, sound_name:str) -> float:
+        """Returns the duration of a sound in seconds
+
+        Args:
+            sound_name: The sound name
+        """
+        if sound_name in self.paths:
+            return self.get_sound(sound_name).get_length()
+        return 0.0
+
+    def memory_report(self) -> dict:
+        """Returns the memory used by the samples of each loaded 
+        sound. For a streamed sound it's the size of its buffer 
+        during the playback, whether it's playing or not
+
+        Returns:
+            dict: Sound name : (mode, bytes in memory, bytes of 
+            the whole decoded sound), mode being "resident" or 
+            "streamed"
+        """
+        if pygame.mixer.get_init() is None:
+            return {}
+        frequency, size, channels = pygame.mixer.get_init()
+        frame_bytes = abs(size) // 8 * channels
+        
+        report = {}
+        for sound_name, sound in self.sounds.items():
+            if isinstance(sound, SoundStream):
+                report[sound_name] = ("streamed", sound.buffer_bytes(), 
+                                      sound.data_bytes)
+            else:
+                total = int(round(sound.get_length() * frequency)) * frame_bytes
+                report[sound_name] = ("resident", total, total)
+        return report
 
     def in_playing(self, sound_name:str) -> bool:
-        if sound_name in self.channels:
-            return self.channels[sound_name].get_busy()
+        """True if the sound is playing or fading out"""
+        return self.state.get(sound_name, STOPPED) != STOPPED
     
     def total_in_playing(self) -> tuple:
-        num = 0
-        for channel in self.channels.values():
-            if channel.get_busy():
-                num+=1
+        """Returns the number of busy voices and the size of the 
+        pool"""
+        num = sum(voice.name is not None for voice in self.voices)
         
-        return num, len(self.channels)
+        return num, self.voice_count
 
 sounds = SoundManager()
 def get_sounds(soundManagerObject:SoundManager = sounds) -> SoundManager:
@@ -135,9 +661,15 @@ class MusicManager():
     """Class for loading, playing and pausing background music"""
     def __init__(self):
         # Paths
-        self.music = pygame.mixer.music.load("assets/sound/atmosphere.mp3")
+        self.path = "assets/sound/atmosphere.mp3"
+        self.loaded = False
     
     def play_music(self, volume=0.66):
+        # The music is only loaded when it's played for the first time
+        if not self.loaded:
+            assets.init_mixer()
+            pygame.mixer.music.load(self.path)
+            self.loaded = True
         pygame.mixer.music.set_volume(volume)
         pygame.mixer.music.play(-1)
     
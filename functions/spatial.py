@@ -0,0 +1,113 @@
+"""
+spatial.py - Spatial index module
+
+This module provides a uniform grid (spatial hash) used to find
+the elements of the scene located near a point or in the cells 
+swept by the turrets without having to go through all of them.
+"""
+from functions.display import pygame
+
+class SpatialGrid():
+    """Uniform grid splitting the screen into square cells of
+    cell_size pixels. Each element is registered, under a key
+    chosen by the owner of the grid, in all the cells covered by
+    its rect. A query only visits the cells it touches and returns
+    the keys found in them: these are candidates which must then
+    be checked precisely by the caller.
+
+    The cells are stored in a dictionary, only the cells
+    containing at least one element exist, so the grid isn't
+    bounded by the screen size.
+    """
+    def __init__(self, cell_size:int = 64):
+        self.cell_size = cell_size
+        self.cells = {} # (column, row) : set of keys
+        self.key_cells = {} # key : list of (column, row)
+
+    def __len__(self) -> int:
+        return len(self.key_cells)
+
+    def cells_in_rect(self, rect:pygame.Rect) -> list:
+        """Returns the coordinates of all the cells covered by
+        a rect
+
+        Args:
+            rect : A pygame.rect.Rect object
+
+        Returns:
+            list: (column, row) of the covered cells
+        """
+        size = self.cell_size
+        first_col, last_col = rect.left // size, (rect.right - 1) // size
+        first_row, last_row = rect.top // size, (rect.bottom - 1) // size
+
+        return [(col, row)
+                for col in range(first_col, last_col + 1)
+                for row in range(first_row, last_row + 1)]
+
+    def insert(self, key, rect:pygame.Rect) -> None:
+        """Registers an element in all the cells covered by its rect
+
+        Args:
+            key : Identifier of the element
+            rect : Rect of the element
+        """
+        if key in self.key_cells:
+            self.remove(key)
+
+        cells = self.cells_in_rect(rect)
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(key)
+        self.key_cells[key] = cells
+
+    def remove(self, key) -> None:
+        """Removes an element from the grid
+
+        Args:
+            key : Identifier of the element
+        """
+        for cell in self.key_cells.pop(key, ()):
+            keys = self.cells[cell]
+            keys.discard(key)
+
+            # Empty cells are deleted to keep the dictionary small
+            if not keys:
+                del self.cells[cell]
+
+    def clear(self) -> None:
+        self.cells.clear()
+        self.key_cells.clear()
+
+    def query_rect(self, rect:pygame.Rect) -> set:
+        """Returns the keys of the elements registered in the
+        cells covered by a rect
+
+        Args:
+            rect : Query area
+
+        Returns:
+            set: Keys of the candidate elements
+        """
+        found = set()
+        for cell in self.cells_in_rect(rect):
+            if cell in self.cells:
+                found |= self.cells[cell]
+
+        return found
+
+    def query_cells(self, cells:list) -> set:
+        """Returns the keys of the elements registered in some
+        cells
+
+        Args:
+            cells : (column, row) of the cells
+
+        Returns:
+            set: Keys of the candidate elements
+        """
+        found = set()
+        for cell in cells:
+            if cell in self.cells:
+                found |= self.cells[cell]
+
+        return found
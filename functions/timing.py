@@ -0,0 +1,58 @@
+"""
+timing.py - Timing module
+
+This module provides the fixed time step used to update the
+simulation independently of the display frame rate.
+"""
+
+class FixedTimestep():
+    """Splits the real elapsed time into fixed simulation steps.
+
+    The elapsed time of each frame is added to an accumulator
+    from which as many steps of 'step' seconds as possible are
+    taken. The remainder is kept for the next frame and gives
+    the interpolation factor (alpha) between the previous and the
+    current states of the simulation, used by the display.
+    The simulated time (self.time) only moves forward by whole
+    steps, so the behaviour of the scene is the same whatever
+    the frame rate.
+    """
+    def __init__(self, step:float = 1/60, max_steps:int = 8):
+        self.step = step
+        # A very slow frame (window dragged, breakpoint...) mustn't
+        # trigger an endless catch-up, the elapsed time is capped
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.time = 0.0 # Simulated seconds
+        self.steps_done = 0
+
+    def advance(self, elapsed:float) -> int:
+        """Adds the real elapsed time to the accumulator
+
+        Args:
+            elapsed: Real time elapsed since the previous frame
+            in seconds
+
+        Returns:
+            int: Number of simulation steps to run
+        """
+        self.accumulator += min(elapsed, self.max_steps * self.step)
+        steps = int(self.accumulator // self.step)
+        self.accumulator -= steps * self.step
+
+        return steps
+
+    def tick(self) -> None:
+        """Records that one simulation step has been run"""
+        self.time += self.step
+        self.steps_done += 1
+
+    @property
+    def alpha(self) -> float:
+        """Interpolation factor between the previous and the
+        current simulation states (0.0 to 1.0)"""
+        return self.accumulator / self.step
+
+    def now(self) -> float:
+        """Returns the simulated time in seconds"""
+        return self.time
@@ -0,0 +1,467 @@
+"""
+turrets.py - Turrets module
+
+This module manages all the turrets of the scene together. Their
+angles, modes, targets and reference points are kept in NumPy
+arrays and updated for all the turrets in one step, and detection
+tests the laser and cannon segments of every turret against the
+mobs of the grid cells they sweep in a single pass, over the whole
+sector swept by the turrets during the step.
+"""
+from functions.geometry import np, RefPointTable, sweep_hits
+from functions.mobtable import DESTROYED
+from functions.display import pygame, TurretSprites, RotatedSpriteCache
+from functions.display import laser, line_rects
+from functions.animation import ProjectilePool, ExplosionPool, steam_anim
+from functions.sound import get_sounds
+from functions.resolution import get_resolution
+
+sounds = get_sounds()
+
+# Rotation modes
+SENTINEL, ALERT, FIRE, RETRACT = range(4)
+MODES = ("sentinel", "alert", "fire", "retract")
+
+class TurretBank():
+    """Any number of turrets sharing the same sprites.
+
+    Each turret occupies one index in the arrays of the bank :
+    center, angle, mode (SENTINEL, ALERT, FIRE or RETRACT), id of
+    the targeted mob (-1 if none) and deploy timer. The rotation,
+    the reference points and the detection are computed for all
+    of them at once, as well as the flight of the projectiles and 
+    the explosions, which share a single ProjectilePool and a 
+    single ExplosionPool. Only the shots are started turret by 
+    turret.
+
+    The modes have the same rotation speeds as before, in degrees
+    per second : sentinel 36, alert 6, fire and retract 0.
+    """
+    def __init__(self, screen:pygame.surface.Surface,
+                 sprites:TurretSprites, ref_table:RefPointTable,
+                 sprite_cache:RotatedSpriteCache = None):
+        self.sprites = sprites
+        self.ref_table = ref_table
+        if sprite_cache is None:
+            sprite_cache = RotatedSpriteCache()
+        self.sprite_cache = sprite_cache
+
+        # The laser is as long as the screen width
+        self.laser_length = screen.get_width()
+
+        # Rotation speeds indexed by mode
+        self.speeds = np.array([36.0, 6.0, 0.0, 0.0])
+
+        # Radius of the mobs for the detection, in pixels
+        self.hit_radius = get_resolution().length(4.0)
+
+        # Laser and cannon rays at angle 0, as (lateral offset,
+        # start distance, end distance) from the turret center
+        self.laser_ray = self.ray("laser_start", length=self.laser_length)
+        self.cannon_ray = self.ray("cannon", end_key="target")
+
+        self.centers = np.empty((0, 2))
+        self.angles = np.empty(0)
+        self.previous_angles = np.empty(0) # Angles before the last step
+        self.current_speeds = np.empty(0)
+        self.modes = np.empty(0, dtype=np.int8)
+        self.last_modes = np.empty(0, dtype=np.int8) # Modes at the last update
+        self.sprite_modes = np.empty(0, dtype=np.int8) # Mode of the sprites
+        self.targets = np.empty(0, dtype=np.int64) # Mob ids, -1 if none
+        self.deploy_time = np.empty(0) # Time elapsed since the deploy sound
+        self.deploy_sound_played = np.empty(0, dtype=bool)
+        self.shot_fired = np.empty(0, dtype=bool) # Projectile launched
+        self.hit_angles = np.empty(0) # Exact angle of the last hit, NaN if none
+
+        # Reference points of all the turrets at their current
+        # angle, array of shape (turrets, points, 2)
+        self.points = np.empty((0, len(ref_table.keys), 2))
+
+        # Animations, shared by all the turrets
+        self.projectiles = ProjectilePool()
+        self.explosions = ExplosionPool()
+
+    def __len__(self) -> int:
+        return len(self.angles)
+
+    def add(self, center:tuple, angle:float = 0.0) -> int:
+        """Adds a turret to the bank
+
+        Args:
+            center: Coordinates of the center of the turret
+            angle: Initial angle in degrees
+
+        Returns:
+            int: Index of the turret
+        """
+        self.centers = np.vstack((self.centers, center))
+        self.angles = np.append(self.angles, angle)
+        self.previous_angles = np.append(self.previous_angles, angle)
+        self.current_speeds = np.append(self.current_speeds, 0.0)
+        self.modes = np.append(self.modes, np.int8(SENTINEL))
+        self.last_modes = np.append(self.last_modes, np.int8(SENTINEL))
+        self.sprite_modes = np.append(self.sprite_modes, np.int8(SENTINEL))
+        self.targets = np.append(self.targets, -1)
+        self.deploy_time = np.append(self.deploy_time, 0.0)
+        self.deploy_sound_played = np.append(self.deploy_sound_played, False)
+        self.shot_fired = np.append(self.shot_fired, False)
+        self.hit_angles = np.append(self.hit_angles, np.nan)
+
+        self.update_points()
+        return len(self) - 1
+
+    def get_angle(self, index:int) -> int:
+        """ Get the current angle of a turret """
+        return int(self.angles[index] % 360)
+
+    def get_mode(self, index:int) -> str:
+        """ Get the name of the current mode of a turret """
+        return MODES[self.modes[index]]
+
+    def get_target(self, index:int) -> int:
+        """ Get the id of the mob targeted by a turret, or None """
+        target = int(self.targets[index])
+        return None if target < 0 else target
+
+    def get_hit_angle(self, index:int) -> float:
+        """ Get the exact angle of the last hit of a turret, or None """
+        angle = self.hit_angles[index]
+        return None if np.isnan(angle) else float(angle % 360)
+
+    def ray(self, start_key:str, end_key:str = None,
+            length:float = None) -> tuple:
+        """Describes a segment of the turret at angle 0 as a ray
+        parallel to the cannon axis (see sweep_hits())
+
+        Args:
+            start_key: Reference point where the segment starts
+            end_key: Reference point where it ends
+            length: Length of the segment if it has no end point
+
+        Returns:
+            tuple: Lateral offset, start and end distances along
+            the axis, from the turret center
+        """
+        # At angle 0 the turret points upwards, the axis is -y
+        columns = self.ref_table.columns
+        offsets = self.ref_table.table[0]
+        lateral, near = offsets[columns[start_key]]
+        near = -near
+        if end_key is not None:
+            far = -offsets[columns[end_key]][1]
+        else:
+            far = near + length
+        return float(lateral), float(near), float(far)
+
+    def column(self, key:str) -> np.ndarray:
+        """Returns one reference point of all the turrets
+
+        Args:
+            key: Name of the reference point (see ref_points())
+
+        Returns:
+            np.ndarray: Array of shape (turrets, 2)
+        """
+        return self.points[:, self.ref_table.columns[key]]
+
+    def refs(self, index:int, points:np.ndarray = None) -> dict:
+        """Returns the reference points of a turret as a dictionary
+
+        Args:
+            index: Index of the turret
+            points: Points of all the turrets, defaults to those at
+            the current angles
+        """
+        if points is None:
+            points = self.points
+        return self.ref_table.as_dict(points[index])
+
+    def update_points(self) -> None:
+        """Updates the reference points of all the turrets at
+        their current angle"""
+        self.points = self.ref_table.points_batch(self.angles, self.centers)
+
+    def interpolate(self, alpha:float) -> np.ndarray:
+        """Angles to display between the two last simulation steps
+
+        Args:
+            alpha: Interpolation factor (0.0 to 1.0)
+        """
+        return self.previous_angles + (self.angles - self.previous_angles) * alpha
+
+    def laser_segments(self, angles:np.ndarray = None,
+                       points:np.ndarray = None) -> tuple:
+        """Returns the laser segments of all the turrets, same
+        computation as laser_segment() of the display module
+
+        Args:
+            angles: Angles of the turrets, defaults to the
+            current angles
+            points: Reference points matching these angles
+
+        Returns:
+            tuple: Arrays of shape (turrets, 2) of the origins
+            and the end points of the segments
+        """
+        if angles is None:
+            angles, points = self.angles, self.points
+
+        origins = points[:, self.ref_table.columns["laser_start"]]
+        radians = np.radians(angles)
+        ends = origins - self.laser_length * np.column_stack((np.sin(radians),
+                                                              np.cos(radians)))
+        return origins, ends
+
+    def reset_states(self, indices:np.ndarray) -> None:
+        """Reset all state variables of the given turrets when
+        resuming sentinel mode
+
+        Args:
+            indices: Indices of the turrets
+        """
+        self.targets[indices] = -1 # No target
+        self.deploy_sound_played[indices] = False
+        self.deploy_time[indices] = 0.0
+        self.shot_fired[indices] = False
+        self.projectiles.cancel(indices)
+
+        steam_anim.steam_played = 0 # WORK IN PROGRESS
+
+    def fire_mode(self, index:int, dt:float, mobsObject) -> None:
+        """The cannon of a turret is aligned with the mob.
+
+        The fire mode rotation speed is 0.0, i.e. the turret is
+        stationary. This mode launches the projectile once the 
+        deploy sound is finished
+
+        Args:
+            index: Index of the turret
+            dt: Duration of the simulation step in seconds
+            mobsObject : Mobs object (from display module)
+        """
+        # Play deploy sound
+        if not self.deploy_sound_played[index]:
+            sounds.play_sound("deploy")
+            self.deploy_sound_played[index] = True
+
+        # When the sound deploy is finished, the projectile
+        # is fired. The duration of the sound is counted in 
+        # simulated time so that the shot doesn't depend on the 
+        # frame rate
+        self.deploy_time[index] += dt
+        if (self.shot_fired[index] or 
+            self.deploy_time[index] < sounds.get_length("deploy")):
+            return
+
+        # The target may have been destroyed by another turret
+        # before the shot, the turret drops it and resumes its 
+        # search instead of firing at the debris
+        target_id = int(self.targets[index])
+        if mobsObject.is_destroyed(target_id):
+            self.modes[index] = SENTINEL
+            self.reset_states([index])
+            return
+        
+        target = mobsObject.position(target_id)
+        cannon = self.points[index, self.ref_table.columns["cannon"]]
+        self.projectiles.fire(cannon, target, target_id, index)
+        self.shot_fired[index] = True
+
+    def impact(self, slots:np.ndarray, mobsObject) -> None:
+        """Handles the projectiles which reached their destination, 
+        all at once
+
+        Args:
+            slots: Slots of the arrived projectiles
+            mobsObject : Mobs object (from display module)
+        """
+        if slots.size == 0:
+            return
+        
+        # The targeted mobs are transformed into debris so that the 
+        # turrets remain aligned until the explosion animations 
+        # end. A mob already destroyed by another turret doesn't 
+        # explode twice
+        target_ids = self.projectiles.target_id[slots]
+        destroyed = mobsObject.destroyed_mobs(target_ids)
+        if not destroyed.any():
+            return
+        
+        # The explosions take place on the points reached by the 
+        # projectiles, the mobs are deleted at their end
+        self.explosions.spawn(self.projectiles.target_point[slots[destroyed]],
+                              target_ids[destroyed])
+        
+        # Play blast sound, the explosions overlap up to the
+        # instance limit of the voice pool
+        for _ in range(min(int(np.count_nonzero(destroyed)), 
+                           sounds.instance_limit("blast"))):
+            sounds.play_sound("blast")
+
+    def update(self, dt:float, mobsObject) -> None:
+        """Runs the actions of the current mode of every turret
+        and rotates them by one simulation step
+
+        Args:
+            dt: Duration of the simulation step in seconds
+            mobsObject: Mobs object (from display module)
+        """
+        modes = self.modes
+        sentinel = modes == SENTINEL
+        alert = modes == ALERT
+        fire = modes == FIRE
+
+        # The sprite follows the mode, except in retract mode
+        shown = sentinel | alert | fire
+        self.sprite_modes[shown] = modes[shown]
+
+        # The turrets which resumed their search since the last 
+        # update are reset, their projectiles are cancelled
+        resumed = sentinel & (self.last_modes != SENTINEL)
+        if resumed.any():
+            self.reset_states(np.flatnonzero(resumed))
+
+        # The mode sounds have a single instance shared by all 
+        # the turrets, the most advanced mode is heard
+        if fire.any():
+            sounds.stop_sound("alert")
+            sounds.stop_sound("sentinel")
+        elif alert.any():
+            sounds.stop_sound("sentinel")
+            if not sounds.in_playing("alert"):
+                sounds.play_sound("alert")
+        elif sentinel.any():
+            if not sounds.in_playing("sentinel"):
+                sounds.play_sound("sentinel")
+
+        # Explosions in progress, shots, then flight of all the 
+        # projectiles and new explosions
+        self.explosions.update(dt)
+        
+        for index in np.flatnonzero(fire):
+            self.fire_mode(index, dt, mobsObject)
+        
+        self.impact(self.projectiles.update(dt), mobsObject)
+        self.last_modes = self.modes.copy()
+
+        # The angles are incremented according to the mode speeds
+        self.previous_angles = self.angles.copy()
+        self.current_speeds = self.speeds[modes]
+        self.angles += self.current_speeds * dt
+
+        self.update_points()
+
+    def detect(self, mobsObject) -> None:
+        """Sets the mode of every turret according to the mobs
+        crossed by its laser and cannon during the last step. 
+
+        The whole sector swept since the previous angle is tested, 
+        so a mob can't be missed whatever the rotation speed or the 
+        duration of the step. Only the mobs of the grid cells under 
+        the swept sectors are candidates, and all the rays are 
+        tested against them at once. A turret whose cannon crossed 
+        a mob is turned back to the exact angle of the mob.
+
+        Args:
+            mobsObject: Mobs object (from display module)
+        """
+        count = len(self)
+        table = mobsObject.table
+
+        # Laser rays then cannon rays of all the turrets
+        rays = np.repeat([self.laser_ray, self.cannon_ray], count, axis=0)
+        centers = np.vstack((self.centers, self.centers))
+        start_angles = np.tile(self.previous_angles, 2)
+        end_angles = np.tile(self.angles, 2)
+        rows = mobsObject.sweep_candidates(centers, start_angles, end_angles,
+                                           rays, self.hit_radius)
+
+        # The debris of the destroyed mobs are ignored, except by 
+        # the turret whose shot destroyed its target, which stays 
+        # aligned with it until the explosion ends
+        ids = table.ids[rows]
+        alive = table.state[rows] != DESTROYED
+        own = ((ids[None, :] == self.targets[:, None]) & 
+               self.shot_fired[:, None])
+        mask = np.tile(alive | own, (2, 1))
+
+        hits, angles = sweep_hits(centers, start_angles, end_angles,
+                                  rays[:, 0], rays[:, 1], rays[:, 2],
+                                  table.pos[rows], self.hit_radius, mask)
+        laser_hits, cannon_hits = hits[:count], hits[count:]
+
+        modes = self.modes
+        laser_detect = laser_hits >= 0
+        cannon_detect = cannon_hits >= 0
+
+        # No mobs crossed by the laser
+        modes[~laser_detect & (modes != RETRACT)] = SENTINEL
+
+        # Mob crossed by the laser
+        modes[laser_detect] = ALERT
+
+        # No mob crossed by the cannon
+        self.targets[~cannon_detect & (modes == RETRACT)] = -1
+
+        # Mob crossed by the cannon
+        modes[cannon_detect] = FIRE
+        self.targets[cannon_detect] = ids[cannon_hits[cannon_detect]]
+
+        # Exact angles of the hits, the cannon has priority
+        self.hit_angles = np.where(cannon_detect, angles[count:], angles[:count])
+
+        # The cannon is aligned with its target
+        if cannon_detect.any():
+            self.angles[cannon_detect] = angles[count:][cannon_detect]
+            self.update_points()
+
+    def draw(self, screen:pygame.surface.Surface, angles:np.ndarray,
+             alpha:float = 1.0) -> list:
+        """Displays the projectiles, the explosions and the turrets
+        between the two last simulation steps
+
+        Args:
+            screen: Main Pygame surface
+            angles: Angles to display (see interpolate())
+            alpha: Interpolation factor of the projectiles positions
+
+        Returns:
+            list: Rects of the drawn elements
+        """
+        rects = self.projectiles.draw(screen, alpha)
+        rects += self.explosions.draw(screen)
+
+        # Turret surfaces rotation, the rotated surfaces are only
+        # computed if they aren't already in the cache
+        blits = []
+        for center, angle, sprite_mode in zip(self.centers.tolist(),
+                                              angles.tolist(),
+                                              self.sprite_modes.tolist()):
+            mode = MODES[sprite_mode]
+            image = getattr(self.sprites, f"turret_{mode}")
+            rotated_surface = self.sprite_cache.get(mode, image, angle)
+            blits.append((rotated_surface,
+                          rotated_surface.get_rect(center=center)))
+
+        # Display
+        rects += screen.blits(blits)
+        return rects
+
+    def draw_lasers(self, screen:pygame.surface.Surface,
+                    angles:np.ndarray, points:np.ndarray) -> list:
+        """Displays the lasers of all the turrets
+
+        Args:
+            screen: Main Pygame surface
+            angles: Displayed angles of the turrets
+            points: Reference points matching these angles
+
+        Returns:
+            list: Rects covering the laser lines
+        """
+        rects = []
+        origins = points[:, self.ref_table.columns["laser_start"]]
+        for origin, angle in zip(origins.tolist(), angles.tolist()):
+            start, end = laser(screen, origin, angle)
+            rects += line_rects(start, end, thickness=3)
+        return rects
@@ -0,0 +1,87 @@
+"""
+weather.py - Weather scheduler module
+
+This module plans the weather events (gusts of wind, lightning,
+thunder) in advance instead of rolling a dice at each step. The
+time until the next event is drawn from the exponential
+distribution matching the probability per roll of the dice, and
+the events are kept in a timer heap: at each step only the date
+of the first one is compared with the current time.
+"""
+import heapq
+import itertools
+import math
+
+def event_rate(probability:float, period:float) -> float:
+    """Returns the rate per second of an event which had a given
+    probability to happen at each roll of a dice
+
+    The dice gives a geometric waiting time, the exponential
+    distribution of the same rate has the same probability to
+    wait longer than each roll
+
+    Args:
+        probability: Probability per roll (0 to 1)
+        period: Time between two rolls in seconds
+
+    Returns:
+        float: Mean number of events per second
+    """
+    return -math.log1p(-probability) / period
+
+class WeatherScheduler():
+    """Timer heap of the weather events.
+
+    Each entry is a [time, order, callback] list, the order keeps
+    the events of the same time in their scheduling order. A
+    cancelled entry keeps its place in the heap without callback
+    and is skipped when it's due. run() calls the callbacks of
+    the due events with their scheduled time, so that an event
+    can schedule the next one from it without drift.
+    """
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+        self.fired = 0 # Events run since the creation
+
+    def schedule(self, time:float, callback) -> list:
+        """Schedules a callback
+
+        Args:
+            time: Date of the event, in the time of run()
+            callback: Function called with the date of the event
+
+        Returns:
+            list: The entry, to be given to cancel()
+        """
+        entry = [time, next(self.counter), callback]
+        heapq.heappush(self.heap, entry)
+        return entry
+
+    def cancel(self, entry:list) -> None:
+        """Cancels a scheduled event"""
+        entry[2] = None
+
+    def next_time(self) -> float:
+        """Returns the date of the next event, None if there isn't
+        any"""
+        while self.heap and self.heap[0][2] is None:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def run(self, now:float) -> None:
+        """Runs the events which are due
+
+        Args:
+            now: Current time
+        """
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            time, _, callback = heapq.heappop(heap)
+            if callback is not None:
+                self.fired += 1
+                callback(time)
+
+    def clear(self) -> None:
+        """Cancels all the events"""
+        self.heap.clear()
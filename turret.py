@@ -1,127 +1,70 @@
-import sys
-from functions.display import TurretSprites, pygame, laser, get_mobs
-from functions.display import background, turret_base_sprite, debug_mode
-from functions.geometry import ref_points, detection
-from functions.animation import MakeItRain, RotateTurret, get_rotation
-from functions.animation import get_sounds, get_thunder
+import atexit
+from functions.display import pygame, RotatedSpriteCache
+from functions.profiler import FrameProfiler
 from functions.sound import MusicManager
+from functions.simulation import Simulation
+from functions.resolution import get_resolution
+from functions.replay import SessionRecorder
 
 # Pygame initialisation
 pygame.init()
 
 # Main surface initialisation
-# Support for resolution changes will be added in a future release 
-WIDTH, HEIGHT = 1200, 800 # DEFAULT : 1200, 800
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
+# The scene is drawn at RENDER_SIZE then scaled to the window, a
+# lower internal resolution holds the frame rate on large screens
+WINDOW_SIZE = (1200, 800) # DEFAULT : 1200, 800
+RENDER_SIZE = None # Internal resolution, the window size if None
+screen = get_resolution().open(WINDOW_SIZE, RENDER_SIZE)
+WIDTH, HEIGHT = screen.get_size()
 pygame.display.set_caption("Turret")
 
-# Classes
-rotation = get_rotation()
-turrets = TurretSprites()
-mobs = get_mobs()
-rainfall = MakeItRain(screen)
-music = MusicManager()
-sounds = get_sounds()
-thunder = get_thunder()
-turret_rotation = RotateTurret()
-
 debug = False
 rain = True
 music_on = True
-clock = pygame.time.Clock()
-fps = 60
+prewarm_sprites = False # Rotates all the turret sprites at startup
+prefetch = True # Loads at startup the assets otherwise loaded on first use
+profile = False # Times each stage of the loop (always on in debug mode)
+profile_dump = None # Profile saved on exit (.json or .csv path)
+fps = 60 # Display frame rate, the simulation always runs at 60 steps/s
+turret_positions = [(WIDTH//2, HEIGHT//2)] # Centers of the turrets
+dirty_rects = False # Only refreshes the changed regions (full frames with rain)
+record = None # Session saved on exit (.json path), see benchmarks/replay.py
+seeds = None # Seeds of the random generators, new ones if None
 
-if music_on:
-    music.play_music()
+# Classes
+music = MusicManager()
+# Sentinel sprites every 3 degrees (about 29 MiB at 1200x800), 
+# alert and fire sprites every degree, within 48 MiB (a full turn 
+# at 1 degree weighs about 88 MiB)
+sprite_cache = RotatedSpriteCache(max_bytes=48 * 2**20, step=1.0,
+                                  mode_steps={"sentinel" : 3.0})
+simulation = Simulation(screen, rain=rain, debug=debug, step=1/60,
+                        sprite_cache=sprite_cache,
+                        turret_positions=turret_positions,
+                        dirty_rects=dirty_rects, seeds=seeds)
 
-# BACKGROUND
-background_img = background()
+if record:
+    recorder = SessionRecorder(simulation)
+    atexit.register(recorder.save, record)
 
-# TURRET BASE
-turret_base = turret_base_sprite()
-turret_base_rect = turret_base.get_rect()
-turret_base_rect.center = (WIDTH//2, HEIGHT//2)
+if debug or profile:
+    profiler = FrameProfiler(capacity=240)
+    simulation.timer = profiler
+    if profile_dump:
+        atexit.register(profiler.dump, profile_dump)
 
-# TURRET
-turret_image = turrets.turret_sentinel
-turret_rect = turret_image.get_rect()
-turret_rect.center = (WIDTH//2, HEIGHT//2)
+if prefetch:
+    simulation.prefetch()
 
-# MAIN LOOP
-while True:
-  # Updating reference points at each rotation angle
-  refs = ref_points(screen, turret_rect, rotation.angle)
-  
-  for event in pygame.event.get():
-      if event.type == pygame.QUIT:
-          pygame.quit()
-          sys.exit()
-      
-      # LEFT CLICK
-      if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-        mobs.add_mob(screen, pygame.mouse.get_pos(), turret_base, refs)
-      
-      # RIGHT CLICK
-      if event.type == pygame.MOUSEBUTTONDOWN and event.button == 3:
-        pass
-  
-  # Erase screen
-  screen.fill((25, 25, 25))
-  
-  # If debug mode is activated the background and the 
-  # turret base isn't displayed
-  if not debug:
-    screen.blit(background_img, (0,0))
-    screen.blit(turret_base, turret_base_rect)
-  
-  # Display of living mobs
-  for mob in mobs.living_mobs:
-    screen.blit(mob['image'], mob['rect'])
-  
-  # Rotates the turret by one angle value
-  turret_rotation.rotate(screen, turrets, rotation, mobs, refs)
-  
-  # Displays the laser segment and returns the coordinates 
-  # of its ends
-  laser_segment = laser(screen, refs["laser_start"], rotation.angle)
-  
-  # Checks if a mob is intersected by the segment and returns 
-  # the coordinates of that mob if so. If nothing is detected, 
-  # the function returns None
-  laser_detect = detection(laser_segment[0], laser_segment[1], mobs.living_mobs)
-  
-  # Displaying rain
-  if rain:
-    rainfall.rain()
-  
-  # No mobs intersected by the laser segment
-  if laser_detect == None and rotation.mode != "retract":
-    rotation.mode="sentinel"
-  
-  # Mob intersected by the laser segment
-  if laser_detect != None:
-    rotation.mode="alert"
-  
-  # Checks if a mob is intersected by the cannon segment 
-  # (segment visible only in debug mode)
-  cannon_detect = detection(refs["cannon"], refs["target"], mobs.living_mobs)
-  # Mob intersected by the cannon segment
-  
-  if cannon_detect == None and rotation.mode == "retract":
-    mobs.in_target = None
-  
-  if cannon_detect != None:
-    rotation.mode="fire"
-    mobs.in_target = cannon_detect
-  
-  # Displaying debug mode
-  if debug:
-    debug_mode(screen, refs, turret_base_rect, 
-                rotation, mobs, sounds, thunder,
-                rainfall, clock)
-  
-  # Display upadate
-  pygame.display.flip()
+if music_on:
+    music.play_music()
+
+if prewarm_sprites:
+    # The 3 modes at all their angles, about 205 MiB at 1200x800
+    sprite_cache.max_bytes = None
+    sprite_cache.prewarm(simulation.turrets)
 
-  # Limit loop speed
-  clock.tick(fps)
\ No newline at end of file
+# MAIN LOOP
+# The scene is updated with a fixed time step driven by the real
+# elapsed time and displayed at most 'fps' times per second
+simulation.run(fps)